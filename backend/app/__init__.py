@@ -1,6 +1,13 @@
-from flask import Flask
-from pymongo import MongoClient
+from flask import Flask, jsonify
 from app.config import Config
+from app.json_provider import MongoJSONProvider
+from app.compression import init_compression
+from app.mongo import PoolMonitor, create_client
+from app.metrics import init_metrics, mongo_listeners
+from app.profiling import init_profiling
+from app.tiles import create_tile_indexes
+from app.seats import REGISTRATION_KEY
+from pymongo.errors import OperationFailure
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from dotenv import load_dotenv
@@ -13,17 +20,54 @@ db = None
 
 def create_app():
     app = Flask(__name__)
+    app.json = MongoJSONProvider(app)
     CORS(app, resources={r"/*": {"origins": "*", "supports_credentials": True}})
     app.config.from_object(Config)
 
     global client, db
-    client = MongoClient(app.config['MONGO_URI'])
+    app.mongo_pool = PoolMonitor(app.config['MONGO_MAX_POOL_SIZE'])
+    client = create_client(app.config['MONGO_URI'], app.config, [app.mongo_pool, *mongo_listeners(app.config)])
     db = client.get_database()
 
+    app.mongo_client = client
     app.db = db
     db.users.create_index([("email", 1)], unique=True)
     db.organizations.create_index([("email", 1)], unique=True)
 
+    db.events.create_index([("location", "2dsphere"), ("starts_at", 1)])
+    db.events.create_index([("org_id", 1), ("starts_at", 1), ("_id", 1)])
+    db.events.create_index(
+        [("name", "text"), ("description", "text"), ("address", "text")],
+        weights={"name": 10, "address": 3, "description": 1}, name="events_text"
+    )
+    db.organizations.create_index(
+        [("name", "text"), ("description", "text"), ("address", "text")],
+        weights={"name": 10, "address": 3, "description": 1}, name="organizations_text"
+    )
+    create_tile_indexes(db.event_tiles)
+    db.events.create_index([("tiles", 1)], sparse=True)
+    db.events.create_index([("tile_sweep", 1)], sparse=True)
+    try:
+        db.registrations.create_index(REGISTRATION_KEY, unique=True)
+    except OperationFailure as e:
+        if e.code != 11000:
+            raise
+        # registrations made before the index existed can hold duplicates;
+        # the app still starts, but registering relies on this index
+        app.logger.error('registrations has duplicate (user_id, event_id) pairs; run `flask dedupe-registrations`')
+    db.registrations.create_index([("user_id", 1), ("status", 1), ("starts_at", 1), ("_id", 1)])
+    db.registrations.create_index([("event_id", 1), ("status", 1), ("waitlist_position", 1)])
+    db.notification_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    db.notification_outbox.create_index([("claim", 1)], sparse=True)
+    db.import_jobs.create_index([("finished_at", 1)], expireAfterSeconds=7 * 24 * 3600)
+    db.import_jobs.create_index([("status", 1), ("updated_at", 1)])
+    db.users.create_index([("location", "2dsphere")])
+    db.user_org_affinity.create_index([("user_id", 1), ("org_id", 1)], unique=True)
+    db.user_org_affinity.create_index([("org_id", 1)])
+    db.user_feeds.create_index([("user_id", 1), ("event_id", 1)], unique=True)
+    db.user_feeds.create_index([("user_id", 1), ("score", -1), ("event_id", 1)])
+    db.user_feeds.create_index([("starts_at", 1)])
+
     app.config['JWT_SECRET_KEY'] = app.config.get('SECRET_KEY')
     app.config['JWT_TOKEN_LOCATION'] = ['cookies', 'headers']
     app.config['JWT_COOKIE_SECURE'] = False
@@ -32,12 +76,66 @@ def create_app():
 
     jwt = JWTManager(app)
 
+    from .cache import TieredCache, create_redis_client
+    redis_client = create_redis_client(app.config['CACHE_REDIS_URL'])
+    app.identity_cache = TieredCache('identity', app.config['IDENTITY_CACHE_SIZE'], app.config['IDENTITY_CACHE_TTL'], redis_client)
+    app.identity_cache.listen()
+    app.response_cache = TieredCache('responses', app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_TTL'], redis_client)
+    app.response_cache.listen()
+
+    from .identity import resolve_identity
+
+    @jwt.user_lookup_loader
+    def load_identity(_jwt_header, jwt_data):
+        return resolve_identity(jwt_data.get('userType'), jwt_data['sub'])
+
+    from .media import create_media_store
+    app.media_store = create_media_store(app.config, db)
+
+    from .workers import BoundedProcessPool, PoolSaturated
+    app.image_pool = BoundedProcessPool(app.config['IMAGE_WORKERS'], app.config['IMAGE_MAX_PENDING'], 'images')
+    app.hash_pool = BoundedProcessPool(app.config['HASH_WORKERS'], app.config['HASH_MAX_PENDING'], 'passwords')
+
+    from .passwords import hash_prefix
+    app.password_hash_prefix = hash_prefix(app.config['PASSWORD_HASH_METHOD'])
+
+    @app.errorhandler(PoolSaturated)
+    def server_busy(e):
+        response = jsonify({'error': 'Server is busy, please retry'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
     from .routes.user_routes import users as users_blueprint
     from .routes.volunteering_routes import volunteering as volunteering_blueprint
     from .routes.organization_routes import organizations as organizations_blueprint
+    from .routes.media_routes import media as media_blueprint
+    from .routes.health_routes import health as health_blueprint
     
     app.register_blueprint(users_blueprint, url_prefix='/users')
     app.register_blueprint(volunteering_blueprint, url_prefix='/volunteering')
     app.register_blueprint(organizations_blueprint, url_prefix='/organizations')
+    app.register_blueprint(media_blueprint, url_prefix='/media')
+    app.register_blueprint(health_blueprint)
+
+    init_compression(app)
+    init_metrics(app)
+    init_profiling(app)
+
+    from .commands import register_commands
+    register_commands(app)
+
+    from .event_import import ImportJobs
+    app.import_jobs = ImportJobs(db, app.config)
+    app.import_jobs.start_sweeper()
+
+    from .feed import FeedUpdater
+    app.feed_updater = FeedUpdater(db, app.config)
+    if app.config['FEED_COMPACTOR_ENABLED']:
+        app.feed_updater.start()
+
+    from .outbox import NotificationDispatcher
+    app.notification_dispatcher = NotificationDispatcher(db, app.config)
+    if app.config['NOTIFICATION_DISPATCHER_ENABLED'] and app.config['NOTIFICATION_SERVICE_URL']:
+        app.notification_dispatcher.start()
 
     return app
\ No newline at end of file
@@ -0,0 +1,166 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class LocalCache:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+class RedisCache:
+    def __init__(self, client, namespace, ttl):
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def key(self, key):
+        return f'{self.namespace}:{key}'
+
+    def get(self, key):
+        value = self.client.get(self.key(key))
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.key(key), json.dumps(value), ex=int(ttl or self.ttl))
+
+    def delete(self, key):
+        self.client.delete(self.key(key))
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.key(prefix) + '*', count=500))
+        if keys:
+            self.client.delete(*keys)
+
+class TieredCache:
+    # local LRU in front of an optional shared Redis cache; deletes are
+    # broadcast so every worker process drops its local copy as well
+    def __init__(self, namespace, max_entries, ttl, redis_client=None):
+        self.namespace = namespace
+        self.local = LocalCache(max_entries, ttl)
+        self.shared = RedisCache(redis_client, namespace, ttl) if redis_client is not None else None
+        self.channel = f'{namespace}:invalidate'
+        self.listener = None
+        self.generations = LocalCache(max_entries, ttl)
+        self.generation_lock = threading.Lock()
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None or self.shared is None:
+            return value
+        try:
+            value = self.shared.get(key)
+        except Exception as e:
+            logger.warning('Shared cache read failed: %s', e)
+            return None
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, ttl)
+            except Exception as e:
+                logger.warning('Shared cache write failed: %s', e)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.broadcast('key', key, self.shared.delete if self.shared else None)
+
+    def delete_prefix(self, prefix):
+        self.local.delete_prefix(prefix)
+        self.broadcast('prefix', prefix, self.shared.delete_prefix if self.shared else None)
+
+    def generation(self, tag):
+        # a counter per tag that every invalidation bumps; a fill that sees it
+        # change while it runs may hold data from before the write. None means
+        # the shared counter could not be read, so the fill is not cached
+        if self.shared is None:
+            return self.generations.get(tag) or 0
+        try:
+            return int(self.shared.client.get(self.shared.key(f'generation|{tag}')) or 0)
+        except Exception as e:
+            logger.warning('Shared cache read failed: %s', e)
+            return None
+
+    def bump(self, tag):
+        if self.shared is None:
+            with self.generation_lock:
+                self.generations.set(tag, (self.generations.get(tag) or 0) + 1)
+            return
+        try:
+            key = self.shared.key(f'generation|{tag}')
+            self.shared.client.pipeline().incr(key).expire(key, int(self.shared.ttl)).execute()
+        except Exception as e:
+            logger.warning('Shared cache invalidation failed: %s', e)
+
+    def broadcast(self, kind, key, shared_delete):
+        if self.shared is None:
+            return
+        try:
+            shared_delete(key)
+            self.shared.client.publish(self.channel, json.dumps([kind, key]))
+        except Exception as e:
+            logger.warning('Shared cache invalidation failed: %s', e)
+
+    def listen(self):
+        if self.shared is None or (self.listener and self.listener.is_alive()):
+            return
+        self.listener = threading.Thread(target=self.consume_invalidations, name=f'{self.namespace}-invalidations', daemon=True)
+        self.listener.start()
+
+    def consume_invalidations(self):
+        while True:
+            try:
+                pubsub = self.shared.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    kind, key = json.loads(message['data'])
+                    if kind == 'prefix':
+                        self.local.delete_prefix(key)
+                    else:
+                        self.local.delete(key)
+            except Exception as e:
+                logger.warning('Cache invalidation listener failed, reconnecting: %s', e)
+                time.sleep(1)
+
+def create_redis_client(url):
+    if not url:
+        return None
+    import redis
+    return redis.Redis.from_url(url)
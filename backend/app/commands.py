@@ -0,0 +1,261 @@
+import base64
+import hashlib
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app.media import is_digest, MediaNotFound
+from app.images import ingest_image
+from app.workers import PoolSaturated
+from app.schedule import parse_event_date
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from app.tiles import rebuild_tiles, expire_tiles
+from app.seats import REGISTERED, REGISTRATION_KEY
+from app.profiling import make_token
+from app.feed import compact_feeds, rebuild_user_feed, rebuild_affinity
+
+@click.command('rebuild-event-tiles')
+@with_appcontext
+def rebuild_event_tiles_command():
+    indexed = rebuild_tiles(current_app.db)
+    click.echo(f'Indexed {indexed} upcoming events into event_tiles')
+
+@click.command('expire-event-tiles')
+@with_appcontext
+def expire_event_tiles_command():
+    click.echo(f'Removed {expire_tiles(current_app.db)} past events from event_tiles')
+
+@click.command('backfill-event-locations')
+@with_appcontext
+def backfill_event_locations_command():
+    # out-of-range legacy coordinates would break the 2dsphere index, so they are left without a location
+    db = current_app.db
+    backfilled = db['events'].update_many(
+        {
+            "location": {"$exists": False},
+            "lat": {"$type": "number", "$gte": -90, "$lte": 90},
+            "lng": {"$type": "number", "$gte": -180, "$lte": 180}
+        },
+        [{"$set": {"location": {"type": "Point", "coordinates": ["$lng", "$lat"]}}}]
+    ).modified_count
+    skipped = db['events'].count_documents({"location": {"$exists": False}, "lat": {"$type": "number"}, "lng": {"$type": "number"}})
+    click.echo(f'events: set location on {backfilled} events')
+    if skipped:
+        click.echo(f'events: left {skipped} events with out-of-range lat/lng without a location')
+
+def legacy_image_bytes(value):
+    if os.path.isfile(value):
+        with open(value, 'rb') as file:
+            return file.read()
+    return base64.b64decode(value, validate=True)
+
+def ingest_with_retry(data, attempts):
+    for attempt in range(attempts):
+        try:
+            return ingest_image(current_app.media_store, current_app.image_pool, current_app.config, data)
+        except PoolSaturated:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+@click.command('migrate-images')
+@click.option('--attempts', default=3, show_default=True, help='Tries per image while the image pool is saturated.')
+@with_appcontext
+def migrate_images_command(attempts):
+    # unreadable values are reported and left as they are, never cleared
+    db = current_app.db
+    for collection in ('users', 'organizations'):
+        migrated = 0
+        unreadable, busy = [], []
+        for document in db[collection].find({"image": {"$type": "string"}}, {"image": 1, "image_variants": 1}):
+            if is_digest(document['image']) and document.get('image_variants'):
+                continue
+            try:
+                if is_digest(document['image']):
+                    file, _, _ = current_app.media_store.open(document['image'])
+                    with file:
+                        data = file.read()
+                else:
+                    data = legacy_image_bytes(document['image'])
+                image_fields = ingest_with_retry(data, attempts)
+            except (ValueError, MediaNotFound):
+                unreadable.append(str(document["_id"]))
+                continue
+            except PoolSaturated:
+                busy.append(str(document["_id"]))
+                continue
+            db[collection].update_one({"_id": document["_id"]}, {"$set": image_fields})
+            migrated += 1
+
+        click.echo(f'{collection}: stored {migrated} images with thumbnails')
+        if unreadable:
+            click.echo(f'{collection}: left {len(unreadable)} unreadable images in place: {", ".join(unreadable)}')
+        if busy:
+            click.echo(f'{collection}: skipped {len(busy)} images while the image pool was busy, run again to retry: {", ".join(busy)}')
+
+@click.command('calibrate-password-hash')
+@click.option('--target-ms', default=250, show_default=True, help='Desired time for one hash on this machine.')
+def calibrate_password_hash_command(target_ms):
+    probe_iterations = 100000
+    start = time.perf_counter()
+    hashlib.pbkdf2_hmac('sha256', b'calibration', os.urandom(16), probe_iterations)
+    elapsed = time.perf_counter() - start
+
+    iterations = max(int(probe_iterations * target_ms / 1000 / elapsed), 100000)
+    click.echo(f'PASSWORD_HASH_METHOD=pbkdf2:sha256:{iterations}')
+
+def batches(collection, query, projection, batch_size):
+    # walks the collection in _id order so each batch is an index range scan
+    last_id = None
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+        documents = list(collection.find(batch_query, projection).sort("_id", 1).limit(batch_size))
+        if not documents:
+            return
+        last_id = documents[-1]["_id"]
+        yield documents
+
+def backfill_event_dates(db, batch_size):
+    updated = invalid = 0
+    for events in batches(db['events'], {"starts_at": {"$exists": False}}, {"date": 1}, batch_size):
+        updates = []
+        for event in events:
+            try:
+                starts_at = parse_event_date(event.get("date"))
+            except ValueError:
+                starts_at = None
+                invalid += 1
+            updates.append(UpdateOne({"_id": event["_id"]}, {"$set": {"starts_at": starts_at}}))
+        updated += db['events'].bulk_write(updates, ordered=False).modified_count
+    return updated, invalid
+
+def backfill_registration_dates(db, batch_size):
+    updated = 0
+    for registrations in batches(db['registrations'], {"starts_at": {"$exists": False}}, {"event_id": 1}, batch_size):
+        event_ids = list({registration["event_id"] for registration in registrations})
+        events = {event["_id"]: event for event in db['events'].find({"_id": {"$in": event_ids}}, {"name": 1, "date": 1, "starts_at": 1})}
+        updates = []
+        for registration in registrations:
+            event = events.get(registration["event_id"], {})
+            updates.append(UpdateOne({"_id": registration["_id"]}, {"$set": {
+                "event_name": event.get("name"),
+                "date": event.get("date"),
+                "starts_at": event.get("starts_at")
+            }}))
+        updated += db['registrations'].bulk_write(updates, ordered=False).modified_count
+    return updated
+
+def drop_embedded_array(collection, field, batch_size):
+    dropped = 0
+    for documents in batches(collection, {field: {"$exists": True}}, {"_id": 1}, batch_size):
+        ids = [document["_id"] for document in documents]
+        dropped += collection.update_many({"_id": {"$in": ids}}, {"$unset": {field: ""}}).modified_count
+    return dropped
+
+@click.command('migrate-event-dates')
+@click.option('--batch-size', default=500, show_default=True)
+@with_appcontext
+def migrate_event_dates_command(batch_size):
+    db = current_app.db
+
+    updated, invalid = backfill_event_dates(db, batch_size)
+    click.echo(f'events: set starts_at on {updated} events ({invalid} with unparsable dates set to null)')
+    click.echo(f'registrations: copied event dates onto {backfill_registration_dates(db, batch_size)} registrations')
+    click.echo(f'users: dropped events array from {drop_embedded_array(db["users"], "events", batch_size)} users')
+    click.echo(f'organizations: dropped created_events array from {drop_embedded_array(db["organizations"], "created_events", batch_size)} organizations')
+
+    try:
+        db['events'].drop_index('location_2dsphere_date_1')
+        click.echo('events: dropped superseded location_2dsphere_date_1 index')
+    except OperationFailure:
+        pass
+
+def remove_duplicate_registrations(db):
+    # keeps one registration per volunteer and event, preferring a registered
+    # one over a waitlisted one and then the oldest
+    removed = 0
+    duplicates = db['registrations'].aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "event_id": "$event_id"},
+            "registrations": {"$push": {"_id": "$_id", "status": "$status"}},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True)
+    for group in duplicates:
+        registrations = sorted(group["registrations"], key=lambda registration: registration.get("status") != REGISTERED)
+        extra = [registration["_id"] for registration in registrations[1:]]
+        removed += db['registrations'].delete_many({"_id": {"$in": extra}}).deleted_count
+    return removed
+
+def recount_seats(db, batch_size):
+    updated = 0
+    for events in batches(db['events'], {"capacity": {"$type": "number"}}, {"capacity": 1}, batch_size):
+        registered = {
+            row["_id"]: row["count"]
+            for row in db['registrations'].aggregate([
+                {"$match": {"event_id": {"$in": [event["_id"] for event in events]}, "status": REGISTERED}},
+                {"$group": {"_id": "$event_id", "count": {"$sum": 1}}}
+            ])
+        }
+        updates = [
+            UpdateOne({"_id": event["_id"]}, {"$set": {"seats_available": max(event["capacity"] - registered.get(event["_id"], 0), 0)}})
+            for event in events
+        ]
+        updated += db['events'].bulk_write(updates, ordered=False).modified_count
+    return updated
+
+@click.command('dedupe-registrations')
+@click.option('--batch-size', default=500, show_default=True)
+@with_appcontext
+def dedupe_registrations_command(batch_size):
+    db = current_app.db
+    click.echo(f'registrations: removed {remove_duplicate_registrations(db)} duplicate registrations')
+    click.echo(f'events: corrected seats_available on {recount_seats(db, batch_size)} events')
+    db['registrations'].create_index(REGISTRATION_KEY, unique=True)
+    click.echo('registrations: unique (user_id, event_id) index is in place')
+
+@click.command('profile-token')
+@with_appcontext
+def profile_token_command():
+    secret = current_app.config['PROFILE_SECRET']
+    if not secret:
+        raise click.ClickException('PROFILE_SECRET is not set')
+    click.echo(make_token(secret))
+
+@click.command('compact-feeds')
+@with_appcontext
+def compact_feeds_command():
+    click.echo(f'Removed {compact_feeds(current_app.db)} past entries from user_feeds')
+
+@click.command('rebuild-feeds')
+@click.option('--batch-size', default=500, show_default=True)
+@with_appcontext
+def rebuild_feeds_command(batch_size):
+    db = current_app.db
+    click.echo(f'user_org_affinity: rebuilt {rebuild_affinity(db)} affinities from registrations')
+    followers = set(db['user_org_affinity'].distinct('user_id'))
+    rebuilt = entries = 0
+    for users in batches(db['users'], {}, {"location": 1}, batch_size):
+        for user in users:
+            if user.get("location") or user["_id"] in followers:
+                entries += rebuild_user_feed(db, user["_id"], current_app.config)
+                rebuilt += 1
+    click.echo(f'Rebuilt {rebuilt} feeds with {entries} entries')
+
+def register_commands(app):
+    app.cli.add_command(rebuild_event_tiles_command)
+    app.cli.add_command(backfill_event_locations_command)
+    app.cli.add_command(expire_event_tiles_command)
+    app.cli.add_command(migrate_images_command)
+    app.cli.add_command(calibrate_password_hash_command)
+    app.cli.add_command(migrate_event_dates_command)
+    app.cli.add_command(dedupe_registrations_command)
+    app.cli.add_command(profile_token_command)
+    app.cli.add_command(compact_feeds_command)
+    app.cli.add_command(rebuild_feeds_command)
@@ -0,0 +1,48 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import gevent
+    from gevent import monkey
+except ImportError:
+    gevent = None
+
+LOOKUP_THREADS = 8
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+def cooperative():
+    return gevent is not None and monkey.is_module_patched('socket')
+
+def lookup_executor():
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(LOOKUP_THREADS, thread_name_prefix='lookup')
+            _executor_pid = os.getpid()
+        return _executor
+
+def gather(*calls):
+    # runs independent blocking lookups at once and returns their results in
+    # order: greenlets on gevent workers, a small thread pool otherwise
+    if len(calls) < 2:
+        return [call() for call in calls]
+
+    if cooperative():
+        greenlets = [gevent.spawn(call) for call in calls]
+        gevent.joinall(greenlets, raise_error=True)
+        return [greenlet.value for greenlet in greenlets]
+
+    futures = [lookup_executor().submit(call) for call in calls[1:]]
+    return [calls[0]()] + [future.result() for future in futures]
+
+def spawn(call):
+    # runs call in the background without waiting for it: a greenlet on gevent
+    # workers, the lookup thread pool otherwise
+    if cooperative():
+        gevent.spawn(call)
+    else:
+        lookup_executor().submit(call)
@@ -3,4 +3,81 @@ import os
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY')
     MONGO_URI = os.getenv('MONGO_URI')
-    NOTIFICATION_SERVICE_URL = os.getenv('NOTIFICATION_SERVICE_URL')
\ No newline at end of file
+    NOTIFICATION_SERVICE_URL = os.getenv('NOTIFICATION_SERVICE_URL')
+    NOTIFICATION_BATCH_URL = os.getenv('NOTIFICATION_BATCH_URL')
+    NOTIFICATION_TIMEOUT = float(os.getenv('NOTIFICATION_TIMEOUT', 5))
+    NOTIFICATION_POOL_SIZE = int(os.getenv('NOTIFICATION_POOL_SIZE', 10))
+    OPERATOR_EMAILS = [email.strip().lower() for email in os.getenv('OPERATOR_EMAILS', '').split(',') if email.strip()]
+    NOTIFICATION_DISPATCHER_ENABLED = os.getenv('NOTIFICATION_DISPATCHER_ENABLED', 'true').lower() == 'true'
+    OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+    OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 1))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+    OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', 2))
+    OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', 300))
+    CIRCUIT_BREAKER_THRESHOLD = int(os.getenv('CIRCUIT_BREAKER_THRESHOLD', 5))
+    CIRCUIT_BREAKER_COOLDOWN = float(os.getenv('CIRCUIT_BREAKER_COOLDOWN', 30))
+    NEAREST_EVENTS_MAX_RADIUS = float(os.getenv('NEAREST_EVENTS_MAX_RADIUS', 100))
+    MEDIA_STORE = os.getenv('MEDIA_STORE', 'gridfs')
+    MEDIA_DIR = os.getenv('MEDIA_DIR', './media')
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+    IMAGE_MAX_PENDING = int(os.getenv('IMAGE_MAX_PENDING', 8))
+    IMAGE_TIMEOUT = float(os.getenv('IMAGE_TIMEOUT', 10))
+    IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 1024))
+    IMAGE_VARIANT_SIZES = [int(size) for size in os.getenv('IMAGE_VARIANT_SIZES', '64,128,256').split(',')]
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    HASH_MAX_PENDING = int(os.getenv('HASH_MAX_PENDING', 32))
+    HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', 5))
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+    IDENTITY_CACHE_SIZE = int(os.getenv('IDENTITY_CACHE_SIZE', 10000))
+    IDENTITY_CACHE_TTL = float(os.getenv('IDENTITY_CACHE_TTL', 300))
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 5000))
+    RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 300))
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))
+    READINESS_TIMEOUT = float(os.getenv('READINESS_TIMEOUT', 2))
+    MONGO_SLOW_QUERY_MS = float(os.getenv('MONGO_SLOW_QUERY_MS', 100))
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5000')
+    # caches and their invalidations are per process unless Redis is shared
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', (os.cpu_count() or 1) if CACHE_REDIS_URL else 1))
+    # every web worker has its own hashing pool, so the cores are split between them
+    HASH_WORKERS = int(os.getenv('HASH_WORKERS', max((os.cpu_count() or 1) // WEB_WORKERS, 1)))
+    WEB_WORKER_CLASS = os.getenv('WEB_WORKER_CLASS', 'gthread')
+    WEB_WORKER_CONNECTIONS = int(os.getenv('WEB_WORKER_CONNECTIONS', 1000))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 4))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 30))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+    WEB_KEEPALIVE = int(os.getenv('WEB_KEEPALIVE', 5))
+    WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', 10000))
+    WEB_MAX_REQUESTS_JITTER = int(os.getenv('WEB_MAX_REQUESTS_JITTER', 1000))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', './profiles')
+    PROFILE_SECRET = os.getenv('PROFILE_SECRET')
+    PROFILE_TOKEN_TTL = int(os.getenv('PROFILE_TOKEN_TTL', 3600))
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', 0))
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 5))
+    PROFILE_MAX_CAPTURES = int(os.getenv('PROFILE_MAX_CAPTURES', 200))
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 500))
+    IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', 10000))
+    IMPORT_MAX_BYTES = int(os.getenv('IMPORT_MAX_BYTES', 20 * 1024 * 1024))
+    IMPORT_SYNC_MAX_BYTES = int(os.getenv('IMPORT_SYNC_MAX_BYTES', 256 * 1024))
+    IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 1000))
+    IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', 2))
+    IMPORT_SPOOL_DIR = os.getenv('IMPORT_SPOOL_DIR')
+    IMPORT_HEARTBEAT_INTERVAL = float(os.getenv('IMPORT_HEARTBEAT_INTERVAL', 30))
+    IMPORT_JOB_LEASE = float(os.getenv('IMPORT_JOB_LEASE', 300))
+    FEED_RADIUS_MILES = float(os.getenv('FEED_RADIUS_MILES', 25))
+    FEED_MAX_EVENTS = int(os.getenv('FEED_MAX_EVENTS', 200))
+    FEED_DISTANCE_WEIGHT = float(os.getenv('FEED_DISTANCE_WEIGHT', 1))
+    FEED_AFFINITY_WEIGHT = float(os.getenv('FEED_AFFINITY_WEIGHT', 1))
+    FEED_DATE_SCALE_DAYS = float(os.getenv('FEED_DATE_SCALE_DAYS', 30))
+    FEED_WORKERS = int(os.getenv('FEED_WORKERS', 2))
+    FEED_COMPACT_INTERVAL = float(os.getenv('FEED_COMPACT_INTERVAL', 3600))
+    FEED_COMPACTOR_ENABLED = os.getenv('FEED_COMPACTOR_ENABLED', 'true').lower() == 'true'
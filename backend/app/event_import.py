@@ -0,0 +1,300 @@
+import codecs
+import csv
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+from app.events import build_event, InvalidEvent
+from app.response_cache import invalidate
+from app.tiles import mark_tiled, tile_updates
+
+logger = logging.getLogger(__name__)
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = {
+    'text/csv': CSV,
+    'application/csv': CSV,
+    'application/x-ndjson': NDJSON,
+    'application/jsonl': NDJSON
+}
+SPOOL_CHUNK_BYTES = 64 * 1024
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+class ImportFailed(Exception):
+    pass
+
+def import_format(request):
+    fmt = request.args.get('format') or FORMATS.get(request.mimetype)
+    return fmt if fmt in (CSV, NDJSON) else None
+
+def csv_event(row):
+    data = {key.strip(): value.strip() for key, value in row.items() if key and isinstance(value, str)}
+    try:
+        for field in ('lat', 'lng'):
+            data[field] = float(data[field]) if data.get(field) else None
+    except ValueError:
+        raise InvalidEvent("Invalid latitude or longitude values")
+    try:
+        data['capacity'] = int(data['capacity']) if data.get('capacity') else None
+    except ValueError:
+        raise InvalidEvent("Capacity must be a positive integer")
+    return data
+
+def read_rows(stream, fmt):
+    # decodes and parses the upload line by line; yields (row number, data)
+    # with an InvalidEvent in place of data for rows that do not parse
+    reader = codecs.getreader('utf-8-sig')(stream)
+    if fmt == CSV:
+        for number, row in enumerate(csv.DictReader(reader), start=1):
+            try:
+                yield number, csv_event(row)
+            except InvalidEvent as e:
+                yield number, e
+        return
+
+    for number, line in enumerate(reader, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield number, InvalidEvent("Invalid JSON")
+            continue
+        yield number, data if isinstance(data, dict) else InvalidEvent("Each line must be a JSON object")
+
+def spool(stream, max_bytes, directory=None):
+    size = 0
+    with tempfile.NamedTemporaryFile(prefix='event-import-', dir=directory, delete=False) as file:
+        while True:
+            chunk = stream.read(SPOOL_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                file.close()
+                os.remove(file.name)
+                raise ImportFailed(f'Uploads are limited to {max_bytes} bytes')
+            file.write(chunk)
+    return file.name
+
+def remove_spool(path):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class EventImporter:
+    def __init__(self, db, org_id, config, progress=None, on_insert=None):
+        self.db = db
+        self.org_id = org_id
+        self.chunk_size = config['IMPORT_CHUNK_SIZE']
+        self.max_rows = config['IMPORT_MAX_ROWS']
+        self.max_errors = config['IMPORT_MAX_ERRORS']
+        self.progress = progress
+        self.on_insert = on_insert
+        self.rows = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "error": message})
+
+    def run(self, rows):
+        chunk = []
+        try:
+            for number, data in rows:
+                self.rows += 1
+                if self.rows > self.max_rows:
+                    raise ImportFailed(f'Imports are limited to {self.max_rows} rows')
+                if isinstance(data, InvalidEvent):
+                    self.add_error(number, str(data))
+                    continue
+                try:
+                    chunk.append((number, build_event(data, self.org_id)))
+                except InvalidEvent as e:
+                    self.add_error(number, str(e))
+                    continue
+                if len(chunk) >= self.chunk_size:
+                    pending, chunk = chunk, []
+                    self.flush(pending)
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ImportFailed(f'Could not parse upload: {e}')
+        # a failed import keeps the chunks already written, which report()
+        # counts in inserted, but does not write the rows still pending
+        if chunk:
+            self.flush(chunk)
+
+    def flush(self, chunk):
+        events = [mark_tiled(event) for _, event in chunk]
+        failed = set()
+        try:
+            self.db['events'].insert_many(events, ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+
+        inserted = [event for index, event in enumerate(events) if index not in failed]
+        for index in sorted(failed):
+            self.add_error(chunk[index][0], "Failed to create event")
+
+        updates = [update for event in inserted for update in tile_updates(event)]
+        if updates:
+            self.db['event_tiles'].bulk_write(updates, ordered=False)
+
+        self.inserted += len(inserted)
+        if self.on_insert and inserted:
+            self.on_insert(inserted)
+        if self.progress:
+            self.progress(self)
+
+    def report(self):
+        return {"rows": self.rows, "inserted": self.inserted, "error_count": self.error_count, "errors": self.errors}
+
+class ImportJobs:
+    # jobs run on an in-memory pool, so each process keeps the updated_at of
+    # its own jobs fresh; a job whose worker died stops being refreshed and is
+    # failed by whichever process sweeps it first once IMPORT_JOB_LEASE passes
+    def __init__(self, db, config):
+        self.db = db
+        self.config = config
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.active = set()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(self.config['IMPORT_WORKERS'], thread_name_prefix='event-import')
+                self.pid = os.getpid()
+            return self.executor
+
+    def start(self, app, org_id, fmt, path):
+        now = datetime.utcnow()
+        job_id = self.db['import_jobs'].insert_one({
+            "org_id": ObjectId(org_id),
+            "format": fmt,
+            "status": QUEUED,
+            "rows": 0,
+            "inserted": 0,
+            "error_count": 0,
+            "errors": [],
+            "spool_path": path,
+            "created_at": now,
+            "updated_at": now
+        }).inserted_id
+        with self.lock:
+            self.active.add(job_id)
+        self.get_executor().submit(self.run, app, job_id, org_id, fmt, path)
+        return job_id
+
+    def update(self, job_id, fields):
+        self.db['import_jobs'].update_one({"_id": job_id}, {"$set": {**fields, "updated_at": datetime.utcnow()}})
+
+    def run(self, app, job_id, org_id, fmt, path):
+        try:
+            self.run_job(app, job_id, org_id, fmt, path)
+        finally:
+            with self.lock:
+                self.active.discard(job_id)
+
+    def run_job(self, app, job_id, org_id, fmt, path):
+        with app.app_context():
+            started = self.db['import_jobs'].update_one(
+                {"_id": job_id, "status": QUEUED}, {"$set": {"status": RUNNING, "updated_at": datetime.utcnow()}}
+            )
+            if not started.modified_count:
+                # swept as interrupted while it waited for a free worker
+                remove_spool(path)
+                return
+            importer = EventImporter(
+                self.db, org_id, self.config,
+                progress=lambda importer: self.update(job_id, {
+                    "rows": importer.rows, "inserted": importer.inserted, "error_count": importer.error_count
+                }),
+                on_insert=app.feed_updater.events_added
+            )
+            result = {"status": COMPLETED}
+            try:
+                with open(path, 'rb') as file:
+                    importer.run(read_rows(file, fmt))
+            except ImportFailed as e:
+                result = {"status": FAILED, "error": str(e)}
+            except Exception:
+                logger.exception('Event import %s failed', job_id)
+                result = {"status": FAILED, "error": "Import failed"}
+            finally:
+                remove_spool(path)
+                if importer.inserted:
+                    invalidate('events')
+            self.db['import_jobs'].update_one(
+                {"_id": job_id, "status": RUNNING},
+                {"$set": {**result, **importer.report(), "updated_at": datetime.utcnow(), "finished_at": datetime.utcnow()}}
+            )
+
+    def heartbeat(self):
+        with self.lock:
+            job_ids = list(self.active)
+        if job_ids:
+            self.db['import_jobs'].update_many(
+                {"_id": {"$in": job_ids}, "status": {"$in": [QUEUED, RUNNING]}},
+                {"$set": {"updated_at": datetime.utcnow()}}
+            )
+
+    def sweep(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.config['IMPORT_JOB_LEASE'])
+        stale = {"status": {"$in": [QUEUED, RUNNING]}, "updated_at": {"$lt": cutoff}}
+        swept = 0
+        for job in self.db['import_jobs'].find(stale, {"spool_path": 1}):
+            now = datetime.utcnow()
+            result = self.db['import_jobs'].update_one(
+                {"_id": job["_id"], **stale},
+                {"$set": {"status": FAILED, "error": "Import was interrupted", "updated_at": now, "finished_at": now}}
+            )
+            if result.modified_count:
+                # a spool directory local to another host is out of reach here,
+                # so point IMPORT_SPOOL_DIR at shared storage when scaling out
+                remove_spool(job.get("spool_path"))
+                swept += 1
+        return swept
+
+    def start_sweeper(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.maintain, name='import-job-sweeper', daemon=True)
+        self.thread.start()
+
+    def stop_sweeper(self, timeout=None):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def maintain(self):
+        while not self.stop_event.wait(self.config['IMPORT_HEARTBEAT_INTERVAL']):
+            try:
+                self.heartbeat()
+                swept = self.sweep()
+                if swept:
+                    logger.warning('Marked %d interrupted import jobs as failed', swept)
+            except Exception:
+                logger.exception('Import job maintenance failed')
+
+    def get(self, job_id, org_id):
+        return self.db['import_jobs'].find_one({"_id": ObjectId(job_id), "org_id": ObjectId(org_id)})
@@ -0,0 +1,54 @@
+from bson.objectid import ObjectId
+from app.schedule import parse_event_date
+
+class InvalidEvent(ValueError):
+    pass
+
+def event_location(lat, lng):
+    if lat is None or lng is None:
+        return None
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def build_event(data, org_id):
+    if not isinstance(data, dict):
+        raise InvalidEvent("Event must be a JSON object")
+    if not data.get("name") or not data.get("description") or not data.get("date") or not data.get("address"):
+        raise InvalidEvent("Event name, description, date, and address are required")
+
+    lat = data.get("lat")
+    lng = data.get("lng")
+    if (lat is not None and not is_number(lat)) or (lng is not None and not is_number(lng)):
+        raise InvalidEvent("Invalid latitude or longitude values")
+    if (lat is not None and not -90 <= lat <= 90) or (lng is not None and not -180 <= lng <= 180):
+        raise InvalidEvent("Invalid latitude or longitude values")
+
+    capacity = data.get("capacity")
+    if capacity is not None and (isinstance(capacity, bool) or not isinstance(capacity, int) or capacity < 1):
+        raise InvalidEvent("Capacity must be a positive integer")
+
+    try:
+        starts_at = parse_event_date(data["date"])
+    except ValueError:
+        raise InvalidEvent("Event date must be an ISO date (YYYY-MM-DD)")
+
+    event = {
+        "name": data["name"],
+        "description": data["description"],
+        "date": data["date"],
+        "starts_at": starts_at,
+        "address": data["address"],
+        "lat": lat,
+        "lng": lng,
+        "org_id": ObjectId(org_id)
+    }
+
+    location = event_location(lat, lng)
+    if location:
+        event["location"] = location
+
+    if capacity is not None:
+        event.update({"capacity": capacity, "seats_available": capacity, "waitlist_seq": 0})
+    return event
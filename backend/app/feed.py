@@ -0,0 +1,263 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from math import radians, sin, cos, asin, sqrt
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne, ReturnDocument
+from app.pagination import encode_cursor, decode_cursor, InvalidCursor
+from app.schedule import today_start
+from app.search import EARTH_RADIUS_MILES
+from app.tiles import expire_tiles
+
+logger = logging.getLogger(__name__)
+
+SCORE_EPOCH = datetime(2000, 1, 1)
+MAX_AFFINITY = 5
+WRITE_BATCH_SIZE = 1000
+FEED_EVENT_FIELDS = {"name": 1, "date": 1, "starts_at": 1, "org_id": 1, "lat": 1, "lng": 1}
+
+def distance_miles(lat1, lng1, lat2, lng2):
+    dlat = radians(lat2 - lat1)
+    dlng = radians(lng2 - lng1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * asin(sqrt(a))
+
+def home_of(user):
+    location = (user or {}).get("location")
+    return location["coordinates"] if location else None
+
+def within_radius(coordinates, radius):
+    return {"$geoWithin": {"$centerSphere": [coordinates, radius / EARTH_RADIUS_MILES]}}
+
+def score_event(event, home, affinity, config):
+    distance = None
+    if home and event.get("lat") is not None and event.get("lng") is not None:
+        distance = distance_miles(home[1], home[0], event["lat"], event["lng"])
+    proximity = max(0.0, 1 - distance / config['FEED_RADIUS_MILES']) if distance is not None else 0.0
+
+    # the date term is linear in starts_at, so stored scores keep ranking
+    # sooner events first as time passes without being recomputed
+    days = (event["starts_at"] - SCORE_EPOCH).total_seconds() / 86400
+    score = (
+        config['FEED_DISTANCE_WEIGHT'] * proximity
+        + config['FEED_AFFINITY_WEIGHT'] * min(affinity, MAX_AFFINITY) / MAX_AFFINITY
+        - days / config['FEED_DATE_SCALE_DAYS']
+    )
+    return score, distance
+
+def feed_upsert(user_id, event, home, affinity, config):
+    score, distance = score_event(event, home, affinity, config)
+    return UpdateOne(
+        {"user_id": user_id, "event_id": event["_id"]},
+        {"$set": {
+            "score": score,
+            "distance": distance,
+            "starts_at": event["starts_at"],
+            "name": event["name"],
+            "date": event["date"],
+            "org_id": event["org_id"]
+        }},
+        upsert=True
+    )
+
+def write_in_batches(db, updates):
+    for start in range(0, len(updates), WRITE_BATCH_SIZE):
+        db['user_feeds'].bulk_write(updates[start:start + WRITE_BATCH_SIZE], ordered=False)
+
+def upcoming(event):
+    return isinstance(event.get("starts_at"), datetime) and event["starts_at"] >= today_start()
+
+def fan_out_events(db, events, config):
+    # pushes new events into the feeds of volunteers nearby and of volunteers
+    # who registered with the organizer before
+    for event in filter(upcoming, events):
+        affinities = {
+            affinity["user_id"]: affinity["count"]
+            for affinity in db['user_org_affinity'].find({"org_id": event["org_id"]}, {"user_id": 1, "count": 1})
+        }
+        homes = {
+            user["_id"]: home_of(user)
+            for user in db['users'].find({"_id": {"$in": list(affinities)}}, {"location": 1})
+        } if affinities else {}
+        if event.get("location"):
+            radius = within_radius(event["location"]["coordinates"], config['FEED_RADIUS_MILES'])
+            for user in db['users'].find({"location": radius}, {"location": 1}):
+                homes[user["_id"]] = home_of(user)
+
+        write_in_batches(db, [
+            feed_upsert(user_id, event, home, affinities.get(user_id, 0), config)
+            for user_id, home in homes.items()
+        ])
+
+def candidate_events(db, user_id, home, affinities, config):
+    query = {"starts_at": {"$gte": today_start()}}
+    limit = config['FEED_MAX_EVENTS']
+    events = {}
+    if home:
+        nearby = {**query, "location": within_radius(home, config['FEED_RADIUS_MILES'])}
+        for event in db['events'].find(nearby, FEED_EVENT_FIELDS).sort("starts_at", 1).limit(limit):
+            events[event["_id"]] = event
+    if affinities:
+        followed = {**query, "org_id": {"$in": list(affinities)}}
+        for event in db['events'].find(followed, FEED_EVENT_FIELDS).sort("starts_at", 1).limit(limit):
+            events[event["_id"]] = event
+
+    registered = set(db['registrations'].distinct("event_id", {"user_id": user_id, "event_id": {"$in": list(events)}}))
+    return [event for event_id, event in events.items() if event_id not in registered]
+
+def rebuild_user_feed(db, user_id, config):
+    user = db['users'].find_one({"_id": user_id}, {"location": 1})
+    home = home_of(user)
+    affinities = {
+        affinity["org_id"]: affinity["count"]
+        for affinity in db['user_org_affinity'].find({"user_id": user_id}, {"org_id": 1, "count": 1})
+    }
+    events = sorted(
+        candidate_events(db, user_id, home, affinities, config),
+        key=lambda event: score_event(event, home, affinities.get(event["org_id"], 0), config)[0],
+        reverse=True
+    )[:config['FEED_MAX_EVENTS']]
+
+    db['user_feeds'].delete_many({"user_id": user_id})
+    write_in_batches(db, [
+        feed_upsert(user_id, event, home, affinities.get(event["org_id"], 0), config) for event in events
+    ])
+    return len(events)
+
+def refresh_org_events(db, user_id, org_id, affinity, config):
+    home = home_of(db['users'].find_one({"_id": user_id}, {"location": 1}))
+    events = list(db['events'].find(
+        {"org_id": org_id, "starts_at": {"$gte": today_start()}}, FEED_EVENT_FIELDS
+    ).sort("starts_at", 1).limit(config['FEED_MAX_EVENTS']))
+    registered = set(db['registrations'].distinct(
+        "event_id", {"user_id": user_id, "event_id": {"$in": [e["_id"] for e in events]}}
+    ))
+    write_in_batches(db, [
+        feed_upsert(user_id, e, home, affinity, config) for e in events if e["_id"] not in registered
+    ])
+
+def record_registration(db, user_id, event, config):
+    affinity = db['user_org_affinity'].find_one_and_update(
+        {"user_id": user_id, "org_id": event["org_id"]},
+        {"$inc": {"count": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )["count"]
+    db['user_feeds'].delete_one({"user_id": user_id, "event_id": event["_id"]})
+    refresh_org_events(db, user_id, event["org_id"], affinity, config)
+
+def record_cancellation(db, user_id, event, config):
+    # the cancelled event becomes a candidate again and the organizer's other
+    # events are rescored with the lower affinity
+    affinity = db['user_org_affinity'].find_one_and_update(
+        {"user_id": user_id, "org_id": event["org_id"], "count": {"$gt": 0}},
+        {"$inc": {"count": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    refresh_org_events(db, user_id, event["org_id"], affinity["count"] if affinity else 0, config)
+
+def rebuild_affinity(db):
+    # derives every volunteer's affinity from the registrations already stored,
+    # so volunteers who registered before affinity was tracked are counted too
+    # only rows that existed before the merge can be stale; pairs that live
+    # registrations upsert meanwhile have later _ids and are kept
+    stamp = ObjectId()
+    last = db['user_org_affinity'].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    db['registrations'].aggregate([
+        {"$lookup": {"from": "events", "localField": "event_id", "foreignField": "_id", "as": "event"}},
+        {"$unwind": "$event"},
+        {"$group": {"_id": {"user_id": "$user_id", "org_id": "$event.org_id"}, "count": {"$sum": 1}}},
+        {"$project": {"_id": 0, "user_id": "$_id.user_id", "org_id": "$_id.org_id", "count": 1, "rebuilt": stamp}},
+        {"$merge": {"into": "user_org_affinity", "on": ["user_id", "org_id"], "whenMatched": "merge", "whenNotMatched": "insert"}}
+    ], allowDiskUse=True)
+    if last:
+        db['user_org_affinity'].delete_many({"_id": {"$lte": last["_id"]}, "rebuilt": {"$ne": stamp}})
+    return db['user_org_affinity'].count_documents({})
+
+def compact_feeds(db):
+    return db['user_feeds'].delete_many({"starts_at": {"$lt": today_start()}}).deleted_count
+
+def feed_page(db, user_id, cursor, limit):
+    query = {"user_id": user_id, "starts_at": {"$gte": today_start()}}
+    if cursor:
+        try:
+            last_score, last_id = decode_cursor(cursor, 2)
+            last_score, last_id = float(last_score), ObjectId(last_id)
+        except (InvalidCursor, InvalidId, TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        query["$or"] = [
+            {"score": {"$lt": last_score}},
+            {"score": last_score, "event_id": {"$gt": last_id}}
+        ]
+
+    entries = list(db['user_feeds'].find(query).sort([("score", -1), ("event_id", 1)]).limit(limit + 1))
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1]["score"], str(entries[-1]["event_id"]))
+    return entries, next_cursor
+
+class FeedUpdater:
+    def __init__(self, db, config):
+        self.db = db
+        self.config = config
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(self.config['FEED_WORKERS'], thread_name_prefix='feed-updater')
+                self.pid = os.getpid()
+            return self.executor
+
+    def submit(self, fn, *args):
+        def run():
+            try:
+                fn(self.db, *args, self.config)
+            except Exception:
+                logger.exception('Feed update %s failed', fn.__name__)
+        self.get_executor().submit(run)
+
+    def events_added(self, events):
+        self.submit(fan_out_events, list(events))
+
+    def registered(self, user_id, event):
+        self.submit(record_registration, ObjectId(user_id), event)
+
+    def cancelled(self, user_id, event):
+        self.submit(record_cancellation, ObjectId(user_id), event)
+
+    def user_moved(self, user_id):
+        self.submit(rebuild_user_feed, ObjectId(user_id))
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='feed-compactor', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def run(self):
+        # also takes passed events out of the map tiles, which age the same way
+        while not self.stop_event.wait(self.config['FEED_COMPACT_INTERVAL']):
+            try:
+                removed = compact_feeds(self.db)
+                if removed:
+                    logger.info('Feed compactor removed %d past entries', removed)
+                expired = expire_tiles(self.db)
+                if expired:
+                    logger.info('Feed compactor removed %d past events from the map tiles', expired)
+            except Exception:
+                logger.exception('Feed compaction failed')
@@ -0,0 +1,45 @@
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from flask import current_app
+
+COLLECTIONS = {
+    'volunteer': 'users',
+    'organization': 'organizations'
+}
+
+def identity_key(user_type, user_id):
+    return f'{user_type}:{user_id}'
+
+def resolve_identity(user_type, user_id):
+    # access tokens issued before the userType claim existed are resolved
+    # against both collections, as the routes did before the cache
+    if user_type is None:
+        for candidate in COLLECTIONS:
+            identity = resolve_identity(candidate, user_id)
+            if identity is not None:
+                return identity
+        return None
+
+    collection = COLLECTIONS.get(user_type)
+    if collection is None:
+        return None
+
+    cache = current_app.identity_cache
+    key = identity_key(user_type, user_id)
+    identity = cache.get(key)
+    if identity is not None:
+        return identity
+
+    try:
+        document = current_app.db[collection].find_one({'_id': ObjectId(user_id)}, {'email': 1})
+    except (InvalidId, TypeError):
+        return None
+    if document is None:
+        return None
+
+    identity = {'id': str(document['_id']), 'email': document['email'], 'userType': user_type}
+    cache.set(key, identity)
+    return identity
+
+def invalidate_identity(user_type, user_id):
+    current_app.identity_cache.delete(identity_key(user_type, user_id))
@@ -0,0 +1,58 @@
+import io
+from PIL import Image, ImageOps, UnidentifiedImageError
+from app.media import store_image, media_url, UnsupportedMedia
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+def encode(image, format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+def render_variants(data, sizes, max_dimension):
+    # runs in a worker process; re-encoding drops EXIF/ICC/XMP metadata
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            source.load()
+            image = ImageOps.exif_transpose(source)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise UnsupportedMedia(f'Unsupported image: {e}')
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    if has_alpha:
+        original = encode(image, 'PNG', optimize=True)
+    else:
+        original = encode(image, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+    renditions = {
+        'original': original,
+        'webp': encode(image, 'WEBP', quality=WEBP_QUALITY, method=4)
+    }
+    for size in sizes:
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        renditions[str(size)] = encode(thumbnail, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return renditions
+
+def ingest_image(store, pool, config, data):
+    renditions = pool.run(
+        render_variants, data, config['IMAGE_VARIANT_SIZES'], config['IMAGE_MAX_DIMENSION'],
+        timeout=config['IMAGE_TIMEOUT']
+    )
+    digests = {name: store_image(store, rendition) for name, rendition in renditions.items()}
+    return {
+        'image': digests.pop('original'),
+        'image_variants': digests
+    }
+
+def image_url(document, size=None):
+    variants = document.get('image_variants') or {}
+    if size is not None:
+        sizes = sorted(int(name) for name in variants if name.isdigit())
+        if sizes:
+            chosen = next((candidate for candidate in sizes if candidate >= size), sizes[-1])
+            return media_url(variants[str(chosen)])
+    return media_url(document.get('image'))
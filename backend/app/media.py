@@ -0,0 +1,102 @@
+import hashlib
+import os
+import re
+import tempfile
+import gridfs
+from flask import url_for
+from pymongo.errors import DuplicateKeyError
+
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+class MediaNotFound(Exception):
+    pass
+
+class UnsupportedMedia(ValueError):
+    pass
+
+def sniff_image_type(data):
+    for signature, content_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+def is_digest(value):
+    return isinstance(value, str) and bool(DIGEST_PATTERN.match(value))
+
+def media_url(digest):
+    if not is_digest(digest):
+        return ''
+    return url_for('media.get_media', digest=digest)
+
+class GridFSMediaStore:
+    def __init__(self, db):
+        self.db = db
+        self.bucket = gridfs.GridFSBucket(db, bucket_name='media')
+
+    def exists(self, digest):
+        return self.db['media.files'].count_documents({"_id": digest}, limit=1) > 0
+
+    def put(self, digest, data, content_type):
+        if self.exists(digest):
+            return
+        try:
+            self.bucket.upload_from_stream_with_id(digest, digest, data, metadata={"contentType": content_type})
+        except (DuplicateKeyError, gridfs.errors.FileExists):
+            pass
+
+    def open(self, digest):
+        try:
+            grid_out = self.bucket.open_download_stream(digest)
+        except gridfs.errors.NoFile:
+            raise MediaNotFound(digest)
+        return grid_out, grid_out.length, grid_out.metadata["contentType"]
+
+class LocalMediaStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, digest, data, content_type):
+        path = self.path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+
+    def open(self, digest):
+        path = self.path(digest)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            raise MediaNotFound(digest)
+        head = file.read(12)
+        file.seek(0)
+        return file, os.fstat(file.fileno()).st_size, sniff_image_type(head) or 'application/octet-stream'
+
+def create_media_store(config, db):
+    if config['MEDIA_STORE'] == 'local':
+        return LocalMediaStore(config['MEDIA_DIR'])
+    return GridFSMediaStore(db)
+
+def store_image(store, data):
+    content_type = sniff_image_type(data)
+    if content_type is None:
+        raise UnsupportedMedia('Unsupported image type')
+    digest = hashlib.sha256(data).hexdigest()
+    store.put(digest, data, content_type)
+    return digest
@@ -0,0 +1,96 @@
+# this module is copied verbatim between backend/app and notif_server; change both copies together
+import os
+import threading
+import pymongo
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    # tracks the connection pools of one client in the process that created it
+    def __init__(self, max_pool_size):
+        self.pid = os.getpid()
+        self.max_pool_size = max_pool_size
+        self.lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.wait_timeouts = 0
+
+    def _add(self, field, delta):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + delta)
+
+    def connection_created(self, event):
+        self._add('open', 1)
+
+    def connection_closed(self, event):
+        self._add('open', -1)
+
+    def connection_checked_out(self, event):
+        self._add('checked_out', 1)
+
+    def connection_checked_in(self, event):
+        self._add('checked_out', -1)
+
+    def connection_check_out_failed(self, event):
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            self._add('wait_timeouts', 1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'max_pool_size': self.max_pool_size,
+                'open': self.open,
+                'checked_out': self.checked_out,
+                'wait_timeouts': self.wait_timeouts
+            }
+
+def create_client(uri, config, listeners):
+    # connect=False defers sockets and monitor threads to the first operation,
+    # so a client is never shared across a fork
+    return MongoClient(
+        uri,
+        maxPoolSize=config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=config['MONGO_MIN_POOL_SIZE'],
+        maxIdleTimeMS=config['MONGO_MAX_IDLE_TIME_MS'],
+        connectTimeoutMS=config['MONGO_CONNECT_TIMEOUT_MS'],
+        serverSelectionTimeoutMS=config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        socketTimeoutMS=config['MONGO_SOCKET_TIMEOUT_MS'],
+        waitQueueTimeoutMS=config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        event_listeners=listeners,
+        connect=False
+    )
+
+def check_readiness(client, monitor, timeout):
+    status = monitor.snapshot()
+    if status['pid'] != monitor.pid:
+        status['mongo'] = 'client was created before fork'
+        return False, status
+
+    try:
+        with pymongo.timeout(timeout):
+            client.admin.command('ping')
+    except PyMongoError as e:
+        status['mongo'] = str(e)
+        return False, status
+
+    status['mongo'] = 'ok'
+    return status['checked_out'] < monitor.max_pool_size, status
@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from bson.objectid import ObjectId
+from app.metrics import HTTP_CLIENT_DURATION
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SENDING = 'sending'
+FAILED = 'failed'
+
+def enqueue_notification(db, org_id, message, session=None):
+    now = datetime.utcnow()
+    return db['notification_outbox'].insert_one({
+        "org_id": org_id,
+        "message": message,
+        "status": PENDING,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now
+    }, session=session).inserted_id
+
+def queue_depth(db):
+    counts = {PENDING: 0, SENDING: 0, FAILED: 0}
+    for row in db['notification_outbox'].aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["count"]
+    return counts
+
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        return self.state != 'open'
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+class NotificationDispatcher:
+    def __init__(self, db, config):
+        self.db = db
+        self.url = config['NOTIFICATION_SERVICE_URL']
+        self.batch_url = config['NOTIFICATION_BATCH_URL'] or f"{(self.url or '').rstrip('/')}/batch"
+        self.timeout = config['NOTIFICATION_TIMEOUT']
+        self.batch_size = config['OUTBOX_BATCH_SIZE']
+        self.poll_interval = config['OUTBOX_POLL_INTERVAL']
+        self.max_attempts = config['OUTBOX_MAX_ATTEMPTS']
+        self.backoff_base = config['OUTBOX_BACKOFF_BASE']
+        self.backoff_max = config['OUTBOX_BACKOFF_MAX']
+        self.lease = timedelta(seconds=self.timeout * 2 + self.poll_interval)
+        self.breaker = CircuitBreaker(config['CIRCUIT_BREAKER_THRESHOLD'], config['CIRCUIT_BREAKER_COOLDOWN'])
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config['NOTIFICATION_POOL_SIZE'])
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='notification-dispatcher', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+        self.session.close()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                dispatched = self.dispatch_batch()
+            except Exception:
+                logger.exception('Notification dispatcher iteration failed')
+                dispatched = 0
+            if dispatched < self.batch_size:
+                self.stop_event.wait(self.poll_interval)
+
+    def claim_batch(self):
+        # picks candidates with one read and claims them with one write; the
+        # claim token tells which of them this dispatcher actually won when
+        # another worker raced it for the same records
+        now = datetime.utcnow()
+        claimable = {"$or": [
+            {"status": PENDING, "next_attempt_at": {"$lte": now}},
+            {"status": SENDING, "locked_until": {"$lt": now}}
+        ]}
+        ids = [record["_id"] for record in self.db['notification_outbox'].find(
+            claimable, {"_id": 1}
+        ).sort("next_attempt_at", 1).limit(self.batch_size)]
+        if not ids:
+            return []
+
+        claim = ObjectId()
+        self.db['notification_outbox'].update_many(
+            {"_id": {"$in": ids}, **claimable},
+            {"$set": {"status": SENDING, "locked_until": now + self.lease, "claim": claim}}
+        )
+        return list(self.db['notification_outbox'].find({"claim": claim}).sort("next_attempt_at", 1))
+
+    def dispatch_batch(self):
+        if not self.breaker.allow():
+            return 0
+
+        batch = self.claim_batch()
+        if not batch:
+            return 0
+
+        failed = self.send(batch)
+        if failed is None:
+            self.breaker.record_failure()
+            failed = set(range(len(batch)))
+        else:
+            self.breaker.record_success()
+
+        delivered = [record["_id"] for index, record in enumerate(batch) if index not in failed]
+        if delivered:
+            self.db['notification_outbox'].delete_many({"_id": {"$in": delivered}, "claim": batch[0]["claim"]})
+        for index in failed:
+            self.reschedule(batch[index])
+        return len(batch)
+
+    def send(self, batch):
+        started = time.perf_counter()
+        try:
+            response = self.session.post(
+                self.batch_url,
+                json=[{"org_id": record["org_id"], "message": record["message"]} for record in batch],
+                timeout=self.timeout
+            )
+        except requests.exceptions.RequestException as e:
+            HTTP_CLIENT_DURATION.labels('notification_service', 'error').observe(time.perf_counter() - started)
+            logger.warning('Notification delivery failed: %s', e)
+            return None
+        HTTP_CLIENT_DURATION.labels('notification_service', response.status_code).observe(time.perf_counter() - started)
+
+        if response.status_code not in (201, 207):
+            logger.warning('Notification service responded with %s', response.status_code)
+            return None
+        return {error["index"] for error in response.json().get("errors", [])}
+
+    def reschedule(self, record):
+        attempts = record.get("attempts", 0) + 1
+        if attempts >= self.max_attempts:
+            update = {"$set": {"status": FAILED, "attempts": attempts}, "$unset": {"locked_until": "", "claim": ""}}
+        else:
+            delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+            update = {
+                "$set": {
+                    "status": PENDING,
+                    "attempts": attempts,
+                    "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)
+                },
+                "$unset": {"locked_until": "", "claim": ""}
+            }
+        self.db['notification_outbox'].update_one({"_id": record["_id"], "claim": record["claim"]}, update)
+
+    def status(self):
+        return {"queue": queue_depth(self.db), "circuit": self.breaker.state}
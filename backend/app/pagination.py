@@ -0,0 +1,49 @@
+import base64
+import json
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(*parts):
+    raw = json.dumps(parts, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        parts = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+    if not isinstance(parts, list) or len(parts) != size:
+        raise InvalidCursor('Invalid cursor')
+    return parts
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    if value is None or value == '':
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, maximum)
+
+def after_id_query(query, after):
+    if not after:
+        return query
+    try:
+        return {**query, '_id': {'$gt': ObjectId(after)}}
+    except (InvalidId, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+def keyset_page(collection, query, projection, after, limit):
+    documents = list(collection.find(after_id_query(query, after), projection).sort('_id', 1).limit(limit + 1))
+    next_after = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_after = str(documents[-1]['_id'])
+    return documents, next_after
@@ -0,0 +1,54 @@
+import logging
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from app.concurrency import spawn
+
+logger = logging.getLogger(__name__)
+
+def hash_method(stored_hash):
+    return stored_hash.split('$', 1)[0]
+
+def hash_prefix(method):
+    # werkzeug stores the method with its defaults filled in, e.g. scrypt as
+    # scrypt:32768:8:1, so the prefix to compare with comes from a real hash
+    return hash_method(generate_password_hash('probe', method))
+
+def needs_rehash(stored_hash, prefix):
+    return hash_method(stored_hash) != prefix
+
+def hash_password(password):
+    return current_app.hash_pool.run(
+        generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'],
+        timeout=current_app.config['HASH_TIMEOUT']
+    )
+
+def verify_password(stored_hash, password):
+    return current_app.hash_pool.run(
+        check_password_hash, stored_hash, password,
+        timeout=current_app.config['HASH_TIMEOUT']
+    )
+
+def rehash_if_outdated(collection, document, password):
+    if not needs_rehash(document['password'], current_app.password_hash_prefix):
+        return
+
+    pool = current_app.hash_pool
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    timeout = current_app.config['HASH_TIMEOUT']
+
+    def rehash():
+        try:
+            new_hash = pool.run(generate_password_hash, password, method, timeout=timeout)
+        except Exception as e:
+            logger.info('Skipping password rehash: %s', e)
+            return
+        try:
+            # only replace the hash we verified, never a password reset in between
+            collection.update_one(
+                {'_id': document['_id'], 'password': document['password']},
+                {'$set': {'password': new_hash}}
+            )
+        except Exception as e:
+            logger.warning('Password rehash failed: %s', e)
+
+    spawn(rehash)
@@ -0,0 +1,224 @@
+# this module is copied verbatim between backend/app and notif_server; change both copies together
+import cProfile
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from flask import g, jsonify, request, send_from_directory
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+PROFILE_HEADER = 'X-Profile-Token'
+TOKEN_SALT = 'request-profile'
+ADMIN_ENDPOINTS = ('list_profiles', 'download_profile')
+
+def make_token(secret):
+    return URLSafeTimedSerializer(secret, salt=TOKEN_SALT).dumps('profile')
+
+def valid_token(secret, token, max_age):
+    if not secret or not token:
+        return False
+    try:
+        URLSafeTimedSerializer(secret, salt=TOKEN_SALT).loads(token, max_age=max_age)
+    except BadSignature:
+        return False
+    return True
+
+def frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+def collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+class StackSampler:
+    # samples the stacks of threads serving watched requests; greenlets share
+    # one OS thread, so this only sees requests on gthread/sync workers
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.watched = {}
+        self.thread = None
+        self.pid = None
+
+    def ensure_running(self):
+        if self.thread is None or self.pid != os.getpid():
+            self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+            self.pid = os.getpid()
+            self.thread.start()
+
+    def watch(self, thread_id):
+        with self.lock:
+            self.ensure_running()
+            self.watched[thread_id] = Counter()
+
+    def unwatch(self, thread_id):
+        with self.lock:
+            return self.watched.pop(thread_id, None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                thread_ids = list(self.watched)
+            if not thread_ids:
+                continue
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = collapse(frame)
+                with self.lock:
+                    samples = self.watched.get(thread_id)
+                    if samples is not None:
+                        samples[stack] += 1
+
+class CaptureStore:
+    def __init__(self, directory, max_captures):
+        self.directory = os.path.abspath(directory)
+        self.max_captures = max_captures
+
+    def save(self, meta, write):
+        os.makedirs(self.directory, exist_ok=True)
+        created = datetime.now(timezone.utc)
+        endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', meta['endpoint'] or 'unmatched')
+        capture_id = f"{created.strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}-{endpoint}"
+        meta.update({'id': capture_id, 'created_at': created.isoformat(), 'file': f"{capture_id}.{meta['format']}"})
+
+        write(os.path.join(self.directory, meta['file']))
+        with open(os.path.join(self.directory, f'{capture_id}.json'), 'w') as f:
+            json.dump(meta, f)
+        self.prune()
+
+    def list(self, limit):
+        captures = []
+        for name in sorted(os.listdir(self.directory), reverse=True) if os.path.isdir(self.directory) else []:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    captures.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+            if len(captures) >= limit:
+                break
+        return captures
+
+    def prune(self):
+        metas = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        for name in metas[:max(len(metas) - self.max_captures, 0)]:
+            capture_id = name[:-len('.json')]
+            for stale in os.listdir(self.directory):
+                if stale.startswith(capture_id):
+                    try:
+                        os.remove(os.path.join(self.directory, stale))
+                    except OSError:
+                        pass
+
+def write_pstats(profiler):
+    def write(path):
+        profiler.dump_stats(path)
+    return write
+
+def write_collapsed(samples):
+    def write(path):
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+    return write
+
+def init_profiling(app):
+    # opt-in: captures a cProfile of requests carrying a signed X-Profile-Token
+    # or picked by PROFILE_SAMPLE_RATE, and a sampled collapsed-stack profile
+    # of any request slower than PROFILE_SLOW_MS
+    config = app.config
+    secret = config['PROFILE_SECRET']
+    sample_rate = config['PROFILE_SAMPLE_RATE']
+    slow_ms = config['PROFILE_SLOW_MS']
+    if not (secret or sample_rate or slow_ms):
+        return
+
+    store = CaptureStore(config['PROFILE_DIR'], config['PROFILE_MAX_CAPTURES'])
+    sampler = StackSampler(config['PROFILE_SAMPLE_INTERVAL_MS'] / 1000) if slow_ms else None
+
+    def authorized():
+        return valid_token(secret, request.headers.get(PROFILE_HEADER), config['PROFILE_TOKEN_TTL'])
+
+    @app.before_request
+    def start_profile():
+        if request.endpoint in ADMIN_ENDPOINTS:
+            return
+
+        trigger = None
+        if authorized():
+            trigger = 'header'
+        elif sample_rate and random.random() < sample_rate:
+            trigger = 'sample'
+
+        if trigger:
+            profiler = cProfile.Profile()
+            g.profile = (trigger, profiler, time.perf_counter())
+            profiler.enable()
+        elif sampler:
+            sampler.watch(threading.get_ident())
+            g.profile = ('slow', None, time.perf_counter())
+
+    @app.after_request
+    def finish_profile(response):
+        trigger, profiler, started = g.pop('profile', (None, None, None))
+        if trigger is None:
+            return response
+
+        if profiler is not None:
+            profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+        meta = {
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'trigger': trigger
+        }
+
+        if profiler is not None:
+            store.save({**meta, 'format': 'pstats'}, write_pstats(profiler))
+        else:
+            samples = sampler.unwatch(threading.get_ident())
+            if samples and duration_ms >= slow_ms:
+                store.save({**meta, 'format': 'collapsed'}, write_collapsed(samples))
+        return response
+
+    @app.teardown_request
+    def discard_profile(exc):
+        if sampler:
+            sampler.unwatch(threading.get_ident())
+        trigger, profiler, _ = g.pop('profile', (None, None, None))
+        if profiler is not None:
+            profiler.disable()
+
+    def list_captures():
+        if not authorized():
+            return jsonify({'error': 'Invalid or missing profile token'}), 403
+        try:
+            limit = min(int(request.args.get('limit', 50)), config['PROFILE_MAX_CAPTURES'])
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        return jsonify({'captures': store.list(limit)}), 200
+
+    def download_capture(filename):
+        if not authorized():
+            return jsonify({'error': 'Invalid or missing profile token'}), 403
+        return send_from_directory(store.directory, filename, as_attachment=True)
+
+    app.add_url_rule('/admin/profiles', 'list_profiles', list_captures)
+    app.add_url_rule('/admin/profiles/<path:filename>', 'download_profile', download_capture)
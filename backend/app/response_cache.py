@@ -0,0 +1,56 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, request, Response
+from app.streaming import wants_stream
+
+def cache_key(tag, request):
+    return f'{tag}|{request.full_path}'
+
+def build_response(entry):
+    response = Response(entry['body'], mimetype=entry['mimetype'])
+    response.set_etag(entry['etag'])
+    response.last_modified = datetime.fromtimestamp(entry['last_modified'], timezone.utc)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+def cached_response(tag):
+    # tag may be a string or a function of the view arguments; writes
+    # invalidate every cached URL under a tag with invalidate()
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if wants_stream(request):
+                return view(*args, **kwargs)
+
+            cache = current_app.response_cache
+            view_tag = tag(**kwargs) if callable(tag) else tag
+            key = cache_key(view_tag, request)
+            entry = cache.get(key)
+            if entry is None:
+                generation = cache.generation(view_tag)
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body.decode('utf-8'),
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha256(body).hexdigest()[:32],
+                    'last_modified': int(time.time())
+                }
+                if generation is not None:
+                    # an invalidate() between the read above and this check
+                    # means the entry may predate the write, so it is dropped
+                    cache.set(key, entry)
+                    if cache.generation(view_tag) != generation:
+                        cache.delete(key)
+            return build_response(entry)
+        return wrapper
+    return decorator
+
+def invalidate(*tags):
+    for tag in tags:
+        current_app.response_cache.bump(tag)
+        current_app.response_cache.delete_prefix(f'{tag}|')
@@ -0,0 +1,14 @@
+from flask import Blueprint, jsonify, current_app
+from app.mongo import check_readiness
+
+health = Blueprint('health', __name__)
+
+@health.route('/healthz', methods=['GET'])
+def liveness():
+    return jsonify({'status': 'ok'}), 200
+
+@health.route('/readyz', methods=['GET'])
+def readiness():
+    ready, status = check_readiness(current_app.mongo_client, current_app.mongo_pool, current_app.config['READINESS_TIMEOUT'])
+    status['status'] = 'ready' if ready else 'unavailable'
+    return jsonify(status), 200 if ready else 503
@@ -0,0 +1,30 @@
+from flask import Blueprint, jsonify, request, current_app, Response
+from werkzeug.wsgi import wrap_file
+from app.media import is_digest, MediaNotFound
+
+media = Blueprint('media', __name__)
+
+CACHE_MAX_AGE = 31536000
+
+@media.route('/<string:digest>', methods=['GET'])
+def get_media(digest):
+    if not is_digest(digest):
+        return jsonify({'error': 'Invalid media hash'}), 400
+
+    if request.if_none_match.contains(digest):
+        response = Response(status=304)
+        response.set_etag(digest)
+        response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}, immutable'
+        return response
+
+    try:
+        file, length, content_type = current_app.media_store.open(digest)
+    except MediaNotFound:
+        return jsonify({'error': 'Media not found'}), 404
+
+    response = Response(wrap_file(request.environ, file), mimetype=content_type, direct_passthrough=True)
+    response.content_length = length
+    response.set_etag(digest)
+    response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}, immutable'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response.make_conditional(request, accept_ranges=True, complete_length=length)
@@ -1,10 +1,18 @@
 from flask import Blueprint, jsonify, request, current_app, make_response
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, jwt_required, unset_jwt_cookies, get_jwt_identity, decode_token
 from bson.objectid import ObjectId
-from datetime import timedelta, datetime
+from datetime import timedelta
 from email_validator import validate_email, EmailNotValidError
-import base64
+from app.media import UnsupportedMedia
+from app.images import ingest_image, image_url
+from app.workers import PoolSaturated
+from app.identity import invalidate_identity
+from app.schedule import schedule_lists, today_start
+from app.search import parse_search, text_match, date_facet_stages, search
+from app.pagination import parse_limit, keyset_page, after_id_query
+from app.streaming import wants_stream, stream_response
+from app.response_cache import cached_response, invalidate
+from app.passwords import hash_password, verify_password, rehash_if_outdated
 
 organizations = Blueprint('organizations', __name__)
 
@@ -32,17 +40,20 @@ def signup():
     if missing_fields:
         return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
 
-    hashed_password = generate_password_hash(data['password'], method='pbkdf2:sha256')
+    hashed_password = hash_password(data['password'])
 
     image_file = request.files.get('image')
     if image_file:
         try:
-            
-            image_data = base64.b64encode(image_file.read()).decode('utf-8')
+            image_fields = ingest_image(current_app.media_store, current_app.image_pool, current_app.config, image_file.read())
+        except UnsupportedMedia as e:
+            return jsonify({'error': str(e)}), 400
+        except PoolSaturated:
+            return jsonify({'error': 'Image processing is busy, please retry'}), 503
         except Exception as e:
             return jsonify({'error': 'Failed to process image', 'details': str(e)}), 500
     else:
-        image_data = None  
+        image_fields = {'image': None}
 
     organization = {
         'name': data['name'],
@@ -50,13 +61,14 @@ def signup():
         'password': hashed_password,
         'description': data['description'],
         'address': data.get('address', ''),  
-        'image': image_data,  
+        **image_fields
     }
 
     try:
         db['organizations'].insert_one(organization)
     except Exception as e:
         return jsonify({'error': 'Failed to insert organization', 'details': str(e)}), 500
+    invalidate('orgs', 'events')
 
     return jsonify({'message': 'Organization registered successfully'}), 200
 
@@ -65,16 +77,22 @@ def organization_login():
     data = request.get_json()
     db = current_app.db
 
-    organization = db['organizations'].find_one({'email': data['email']})
-    if not organization or not check_password_hash(organization['password'], data['password']):
+    organization = db['organizations'].find_one({'email': data['email']}, {'email': 1, 'password': 1, 'name': 1})
+    if not organization or not verify_password(organization['password'], data['password']):
         return jsonify({'error': 'Invalid email or password'}), 401
 
-    access_token = create_access_token(identity=str(organization['_id']), expires_delta=timedelta(hours=1))
+    rehash_if_outdated(db['organizations'], organization, data['password'])
+
+    access_token = create_access_token(
+        identity=str(organization['_id']),
+        additional_claims={'userType': 'organization', 'name': organization.get('name')},
+        expires_delta=timedelta(hours=1)
+    )
     
     response = make_response(jsonify({
         'message': 'Login successful',
         'organization': {
-            'id': str(organization['_id']),
+            'id': organization['_id'],
             'email': organization['email'],
             'userType': 'organization'
         }
@@ -93,6 +111,7 @@ def logout():
 
 @organizations.route('/get_org_by_id/<org_id>', methods=['GET'])
 @jwt_required()
+@cached_response(lambda org_id: f'org:{org_id}')
 def get_org_by_id(org_id):
     db = current_app.db
 
@@ -105,31 +124,127 @@ def get_org_by_id(org_id):
         return jsonify({'error': 'Organization not found'}), 404
 
     return jsonify({
-        'id': str(organization['_id']),
+        'id': organization['_id'],
         'name': organization['name'],
         'email': organization['email'],
         'address': organization.get('address', ''),
         'description': organization.get('description', ''),
-        'image': organization.get('image', '')  
+        'image': image_url(organization, request.args.get('size', type=int))
     }), 200
 
+ORG_LIST_FIELDS = {'name': 1, 'email': 1, 'address': 1, 'description': 1}
+
+def serialize_org_summary(organization):
+    return {
+        'id': organization['_id'],
+        'name': organization['name'],
+        'email': organization['email'],
+        'address': organization.get('address', ''),
+        'description': organization.get('description', ''),
+    }
+
 @organizations.route('/get_all_orgs', methods=['GET'])
 @jwt_required()
+@cached_response('orgs')
 def get_all_orgs():
     db = current_app.db
-    organizations = db['organizations'].find()
 
-    all_orgs_list = []
-    for organization in organizations:
-        all_orgs_list.append({
-            'id': str(organization['_id']),
-            'name': organization['name'],
-            'email': organization['email'],
-            'address': organization.get('address', ''),
-            'description': organization.get('description', ''),
-        })
+    try:
+        if wants_stream(request):
+            query = after_id_query({}, request.args.get('after'))
+            return stream_response(request, db['organizations'].find(query, ORG_LIST_FIELDS).sort('_id', 1), serialize_org_summary)
 
-    return jsonify(all_orgs_list), 200
+        all_orgs, next_after = keyset_page(
+            db['organizations'], {}, ORG_LIST_FIELDS, request.args.get('after'), parse_limit(request.args.get('limit'))
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+
+    return jsonify({'organizations': [serialize_org_summary(org) for org in all_orgs], 'next_after': next_after}), 200
+
+@organizations.route('/search', methods=['GET'])
+@jwt_required()
+@cached_response('events')
+def search_orgs():
+    # date and distance filters apply to an organization's events, so results
+    # are cached under the events tag, which organization writes also clear
+    db = current_app.db
+
+    try:
+        params = parse_search(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    event_filter = params['filters']
+    filter_stages = []
+    if event_filter:
+        filter_stages = [
+            {'$lookup': {
+                'from': 'events',
+                'localField': '_id',
+                'foreignField': 'org_id',
+                'pipeline': [{'$match': event_filter}, {'$limit': 1}, {'$project': {'_id': 1}}],
+                'as': 'matching_events'
+            }},
+            {'$match': {'matching_events.0': {'$exists': True}}}
+        ]
+
+    facet_stages = [
+        {'$lookup': {
+            'from': 'events',
+            'localField': '_id',
+            'foreignField': 'org_id',
+            'pipeline': [{'$match': event_filter or {'starts_at': {'$gte': today_start()}}}, {'$project': {'starts_at': 1}}],
+            'as': 'events'
+        }},
+        {'$unwind': '$events'},
+        {'$replaceRoot': {'newRoot': '$events'}},
+        *date_facet_stages('starts_at', params['bucket'])
+    ]
+
+    try:
+        orgs, next_cursor, facets = search(
+            db['organizations'],
+            text_match(params['query']),
+            params,
+            [{'$project': {**ORG_LIST_FIELDS, 'score': 1}}],
+            facet_stages,
+            filter_stages
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'organizations': [serialize_org_summary(org) for org in orgs],
+        'next_cursor': next_cursor,
+        'facets': {'event_dates': facets} if facets is not None else None
+    }), 200
+
+MAX_BATCH_IDS = 100
+
+@organizations.route('/by_ids', methods=['GET'])
+@jwt_required()
+def get_orgs_by_ids():
+    db = current_app.db
+    raw_ids = [org_id for org_id in request.args.get('ids', '').split(',') if org_id]
+
+    if not raw_ids:
+        return jsonify({'error': 'ids is required'}), 400
+    if len(raw_ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} ids per request'}), 400
+
+    try:
+        org_ids = [ObjectId(org_id) for org_id in raw_ids]
+    except Exception:
+        return jsonify({'error': 'Invalid organization ID'}), 400
+
+    projection = {**ORG_LIST_FIELDS, 'image': 1, 'image_variants': 1}
+    size = request.args.get('size', type=int)
+    found = []
+    for organization in db['organizations'].find({'_id': {'$in': org_ids}}, projection):
+        found.append({**serialize_org_summary(organization), 'image': image_url(organization, size)})
+
+    return jsonify({'organizations': found}), 200
 
 @organizations.route('/update_org', methods=['PUT'])
 @jwt_required()
@@ -157,14 +272,18 @@ def update_org_profile():
     
     if image_file:
         try:
-            
-            image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            update_data['image'] = image_data
+            update_data.update(ingest_image(current_app.media_store, current_app.image_pool, current_app.config, image_file.read()))
+        except UnsupportedMedia as e:
+            return jsonify({'error': str(e)}), 400
+        except PoolSaturated:
+            return jsonify({'error': 'Image processing is busy, please retry'}), 503
         except Exception as e:
             return jsonify({'error': 'Failed to process image', 'details': str(e)}), 500
     
     try:
         result = db['organizations'].update_one({'_id': ObjectId(org_id)}, {'$set': update_data})
+        invalidate_identity('organization', org_id)
+        invalidate(f'org:{org_id}', 'orgs', 'events')
 
         if result.modified_count == 0:
             return jsonify({'message': 'No changes made'}), 200
@@ -179,6 +298,8 @@ def delete_org_account():
     org_id = get_jwt_identity()
     db = current_app.db
     result = db['organizations'].delete_one({'_id': ObjectId(org_id)})
+    invalidate_identity('organization', org_id)
+    invalidate(f'org:{org_id}', 'orgs', 'events')
 
     if result.deleted_count == 0:
         return jsonify({'error': 'Organization not found'}), 404
@@ -191,16 +312,18 @@ def get_org_events():
     db = current_app.db
     org_id = get_jwt_identity()
 
-    organization = db['organizations'].find_one({"_id": ObjectId(org_id)})
-
-    if not organization:
-        return jsonify({"error": "Organization not found"}), 404
-
-    current_date = datetime.now().strftime('%Y-%m-%d')
-    past_events = [event for event in organization.get('created_events', []) if event['date'] < current_date]
-    upcoming_events = [event for event in organization.get('created_events', []) if event['date'] >= current_date]
-
-    return jsonify({"past_events": past_events, "upcoming_events": upcoming_events}), 200
+    try:
+        events = schedule_lists(
+            db['events'],
+            {"org_id": ObjectId(org_id)},
+            {"name": 1, "date": 1, "starts_at": 1},
+            lambda event: {"id": event["_id"], "name": event["name"], "date": event["date"]},
+            request.args
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(events), 200
 
 @organizations.route('/reset_password', methods=['POST'])
 def reset_password():
@@ -219,7 +342,8 @@ def reset_password():
     if not is_valid_password(new_password):
         return jsonify({'error': 'Password must be at least 8 characters long'}), 400
 
-    hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256')
+    hashed_password = hash_password(new_password)
     db['organizations'].update_one({'_id': ObjectId(org_id)}, {'$set': {'password': hashed_password}})
+    invalidate_identity('organization', org_id)
 
     return jsonify({'message': 'Password updated successfully'}), 200
\ No newline at end of file
@@ -1,14 +1,20 @@
 from flask import Blueprint, jsonify, request, current_app, make_response
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 from flask_jwt_extended import create_access_token, jwt_required, unset_jwt_cookies, get_jwt_identity, decode_token
 from bson.objectid import ObjectId
-from datetime import timedelta, datetime
+from datetime import timedelta
 from email_validator import validate_email, EmailNotValidError
 from jwt import ExpiredSignatureError, InvalidTokenError
 import jwt
-import base64
-import os
+from app.media import UnsupportedMedia
+from app.images import ingest_image, image_url
+from app.workers import PoolSaturated
+from app.identity import resolve_identity, invalidate_identity, COLLECTIONS
+from app.schedule import schedule_lists
+from app.response_cache import cached_response, invalidate
+from app.passwords import hash_password, verify_password, rehash_if_outdated
+from app.events import event_location
+from app.feed import feed_page
+from app.pagination import parse_limit, InvalidCursor
 
 users = Blueprint('users', __name__)
 
@@ -25,9 +31,6 @@ def test_db_connection():
     except Exception as e:
         return jsonify({'error': 'Database connection failed', 'details': str(e)}), 500
 
-UPLOAD_FOLDER = './uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
 @users.route('/signup', methods=['POST'])
 def signup():
     db = current_app.db
@@ -51,20 +54,24 @@ def signup():
         return jsonify({'error': 'Password must be at least 8 characters long'}), 400
 
     image_file = request.files.get('image')
-    image_path = None
+    image_fields = {'image': None}
 
     if image_file:
-        
-        filename = secure_filename(image_file.filename)
-        image_path = os.path.join(UPLOAD_FOLDER, filename)
-        image_file.save(image_path)
+        try:
+            image_fields = ingest_image(current_app.media_store, current_app.image_pool, current_app.config, image_file.read())
+        except UnsupportedMedia as e:
+            return jsonify({'error': str(e)}), 400
+        except PoolSaturated:
+            return jsonify({'error': 'Image processing is busy, please retry'}), 503
+        except Exception as e:
+            return jsonify({'error': 'Failed to process image', 'details': str(e)}), 500
 
-    hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+    hashed_password = hash_password(password)
     user = {
         'email': email,
         'password': hashed_password,
         'userType': user_type,
-        'image': image_path  
+        **image_fields
     }
 
     if user_type == 'volunteer':
@@ -102,16 +109,22 @@ def user_login():
     data = request.get_json()
     db = current_app.db
 
-    user = db['users'].find_one({'email': data['email']})
-    if not user or not check_password_hash(user['password'], data['password']):
+    user = db['users'].find_one({'email': data['email']}, {'email': 1, 'password': 1, 'fullName': 1})
+    if not user or not verify_password(user['password'], data['password']):
         return jsonify({'error': 'Invalid email or password'}), 401
 
-    access_token = create_access_token(identity=str(user['_id']), expires_delta=timedelta(hours=1))
+    rehash_if_outdated(db['users'], user, data['password'])
+
+    access_token = create_access_token(
+        identity=str(user['_id']),
+        additional_claims={'userType': 'volunteer', 'name': user.get('fullName')},
+        expires_delta=timedelta(hours=1)
+    )
     
     response = make_response(jsonify({
         'message': 'Login successful',
         'user': {
-            'id': str(user['_id']),
+            'id': user['_id'],
             'email': user['email'],
             'userType': 'volunteer'
         }
@@ -132,6 +145,7 @@ def logout():
     return response, 200
 
 @users.route('/get_user_by_id/<string:user_id>', methods=['GET'])
+@cached_response(lambda user_id: f'user:{user_id}')
 def get_profile_by_id(user_id):
     db = current_app.db
 
@@ -144,12 +158,12 @@ def get_profile_by_id(user_id):
         return jsonify({'error': 'User not found'}), 404
 
     user_response = {
-        'id': str(user['_id']),
+        'id': user['_id'],
         'email': user['email'],
         'fullName': user.get('fullName', ''),
         'dob': user.get('dob', ''),
         'description': user.get('description', ''),
-        'image': user.get('image', '')  
+        'image': image_url(user, request.args.get('size', type=int))
     }
 
     return jsonify({'user': user_response}), 200
@@ -169,23 +183,61 @@ def update_profile():
         update_data['description'] = data['description']
     if 'fullName' in data:
         update_data['fullName'] = data['fullName']
+    if 'lat' in data or 'lng' in data:
+        try:
+            lat, lng = float(data['lat']), float(data['lng'])
+        except (KeyError, ValueError):
+            return jsonify({'error': 'lat and lng must be given together as numbers'}), 400
+        if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+            return jsonify({'error': 'Invalid latitude or longitude values'}), 400
+        update_data['location'] = event_location(lat, lng)
     if image_file:
         try:
-            image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            update_data['image'] = image_data
+            update_data.update(ingest_image(current_app.media_store, current_app.image_pool, current_app.config, image_file.read()))
+        except UnsupportedMedia as e:
+            return jsonify({'error': str(e)}), 400
+        except PoolSaturated:
+            return jsonify({'error': 'Image processing is busy, please retry'}), 503
         except Exception as e:
             return jsonify({'error': 'Failed to process image', 'details': str(e)}), 500
 
     try:
         result = db['users'].update_one({'_id': ObjectId(user_id)}, {'$set': update_data})
+        invalidate_identity('volunteer', user_id)
+        invalidate(f'user:{user_id}')
         if result.modified_count == 0:
             return jsonify({'message': 'No changes made'}), 200
+        if 'location' in update_data:
+            current_app.feed_updater.user_moved(user_id)
 
         return jsonify({'message': 'Profile updated successfully'}), 200
     except Exception as e:
         return jsonify({'error': 'Failed to update profile', 'details': str(e)}), 500
 
 
+@users.route('/feed', methods=['GET'])
+@jwt_required()
+def get_feed():
+    user_id = get_jwt_identity()
+
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        entries, next_cursor = feed_page(current_app.db, ObjectId(user_id), request.args.get('cursor'), limit)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    except ValueError:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+
+    events = [{
+        'id': entry['event_id'],
+        'name': entry['name'],
+        'date': entry['date'],
+        'organization_id': entry['org_id'],
+        'distance': entry['distance']
+    } for entry in entries]
+
+    return jsonify({'events': events, 'next_cursor': next_cursor}), 200
+
 @users.route('/delete_account', methods=['DELETE'])
 @jwt_required()
 def delete_account():
@@ -193,6 +245,8 @@ def delete_account():
     db = current_app.db
 
     result = db['users'].delete_one({'_id': ObjectId(user_id)})
+    invalidate_identity('volunteer', user_id)
+    invalidate(f'user:{user_id}')
 
     if result.deleted_count == 0:
         return jsonify({'error': 'User not found'}), 404
@@ -216,8 +270,9 @@ def reset_password():
     if not is_valid_password(new_password):
         return jsonify({'error': 'Password must be at least 8 characters long'}), 400
 
-    hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256')
+    hashed_password = hash_password(new_password)
     db['users'].update_one({'_id': ObjectId(user_id)}, {'$set': {'password': hashed_password}})
+    invalidate_identity('volunteer', user_id)
 
     return jsonify({'message': 'Password updated successfully'}), 200
 
@@ -227,16 +282,22 @@ def get_user_events():
     db = current_app.db
     user_id = get_jwt_identity()
 
-    user = db['users'].find_one({"_id": ObjectId(user_id)})
-
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-
-    current_date = datetime.now().strftime('%Y-%m-%d')
-    past_events = [event for event in user.get('events', []) if event['date'] < current_date]
-    upcoming_events = [event for event in user.get('events', []) if event['date'] >= current_date]
-
-    return jsonify({"past_events": past_events, "upcoming_events": upcoming_events}), 200
+    try:
+        events = schedule_lists(
+            db['registrations'],
+            {"user_id": ObjectId(user_id), "status": "registered"},
+            {"event_id": 1, "event_name": 1, "date": 1, "starts_at": 1},
+            lambda registration: {
+                "id": registration["event_id"],
+                "name": registration["event_name"],
+                "date": registration["date"]
+            },
+            request.args
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(events), 200
 
 
 @users.route('/auth', methods=['GET'])
@@ -250,25 +311,18 @@ def auth():
     try:
         decoded = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
         user_id = decoded.get('sub')
-        db = current_app.db
+        user_type = decoded.get('userType') or user_type
 
-        
-        if user_type == 'volunteer':
-            user = db['users'].find_one({'_id': ObjectId(user_id)})
-        elif user_type == 'organization':
-            user = db['organizations'].find_one({'_id': ObjectId(user_id)})
-        else:
+        if user_type not in COLLECTIONS:
             return jsonify({'error': 'Invalid user type'}), 400
 
+        user = resolve_identity(user_type, user_id)
+
         if user:
             return jsonify({
                 'msg': 'Authenticated',
                 'userType': user_type,
-                'user': {
-                    'id': str(user['_id']),
-                    'email': user['email'],
-                    'userType': user_type
-                }
+                'user': user
             }), 200
         else:
             return jsonify({'error': 'User not found'}), 404
@@ -1,32 +1,148 @@
-import requests
-from flask import Blueprint, jsonify, request, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, jsonify, request, current_app, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, current_user
 from bson.objectid import ObjectId
-from geopy.distance import geodesic
-from math import radians, sin, cos, sqrt, atan2
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+from app.concurrency import gather
+from app.pagination import encode_cursor, decode_cursor, parse_limit, after_id_query, InvalidCursor
+from app.images import image_url
+from app.streaming import wants_stream, stream_response
+from app.response_cache import cached_response, invalidate
+from app.outbox import enqueue_notification
+from app.seats import claim_seat, release_seat, next_waitlist_position, promote_waitlist, REGISTERED, WAITLISTED
+from app.schedule import today_start
+from app.events import build_event, InvalidEvent
+from app.event_import import EventImporter, ImportFailed, import_format, read_rows, spool, QUEUED
+from app.search import parse_search, text_match, date_facet_stages, search
+from app.tiles import mark_tiled, index_event, query_clusters, viewport_geometry, INDIVIDUAL_EVENTS_ZOOM
 
 volunteering = Blueprint('volunteering', __name__)
 
+METERS_PER_MILE = 1609.344
+EVENT_SUMMARY = {"name": 1, "date": 1, "starts_at": 1, "org_id": 1, "capacity": 1}
+MAX_VIEWPORT_EVENTS = 500
+
+EVENT_LIST_FIELDS = {"name": 1, "description": 1, "date": 1, "org_id": 1}
+ORGANIZER_THUMBNAIL_SIZE = 64
+
+def organizer_lookup():
+    return {"$lookup": {
+        "from": "organizations",
+        "localField": "org_id",
+        "foreignField": "_id",
+        "pipeline": [{"$project": {"name": 1, "image": 1, "image_variants": 1}}],
+        "as": "organizer"
+    }}
+
+def serialize_event_summary(event):
+    organizer = (event.get("organizer") or [None])[0]
+    return {
+        "id": event["_id"],
+        "name": event["name"],
+        "description": event["description"],
+        "date": event["date"],
+        "organization_id": event["org_id"],
+        "organization": {
+            "id": organizer["_id"],
+            "name": organizer.get("name"),
+            "thumbnail": image_url(organizer, ORGANIZER_THUMBNAIL_SIZE)
+        } if organizer else None
+    }
+
 @volunteering.route('/events', methods=['GET'])
 @jwt_required()
+@cached_response('events')
 def list_events():
     db = current_app.db
-    events = db['events'].find()
-    events_list = []
-
-    for event in events:
-        events_list.append({
-            "id": str(event["_id"]),
-            "name": event["name"],
-            "description": event["description"],
-            "date": event["date"],
-            "organization_id": str(event["organization_id"])
-        })
 
-    return jsonify(events_list), 200
+    try:
+        query = after_id_query({}, request.args.get('after'))
+        pipeline = [{"$match": query}, {"$sort": {"_id": 1}}]
+        streaming = wants_stream(request)
+        if not streaming:
+            limit = parse_limit(request.args.get('limit'))
+            pipeline.append({"$limit": limit + 1})
+    except ValueError:
+        return jsonify({"error": "Invalid cursor or limit"}), 400
+
+    pipeline += [{"$project": EVENT_LIST_FIELDS}, organizer_lookup()]
+    if streaming:
+        return stream_response(request, db['events'].aggregate(pipeline), serialize_event_summary)
+
+    events = list(db['events'].aggregate(pipeline))
+    next_after = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_after = str(events[-1]["_id"])
+
+    return jsonify({"events": [serialize_event_summary(event) for event in events], "next_after": next_after}), 200
+
+@volunteering.route('/search', methods=['GET'])
+@jwt_required()
+@cached_response('events')
+def search_events():
+    db = current_app.db
+
+    try:
+        params = parse_search(request.args)
+        events, next_cursor, facets = search(
+            db['events'],
+            {**text_match(params['query']), **params['filters']},
+            params,
+            [{"$project": {**EVENT_LIST_FIELDS, "score": 1}}, organizer_lookup()],
+            date_facet_stages("starts_at", params['bucket'])
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "events": [serialize_event_summary(event) for event in events],
+        "next_cursor": next_cursor,
+        "facets": {"dates": facets} if facets is not None else None
+    }), 200
+
+@volunteering.route('/events/viewport', methods=['GET'])
+@jwt_required()
+def events_in_viewport():
+    db = current_app.db
+
+    try:
+        south = float(request.args['south'])
+        west = float(request.args['west'])
+        north = float(request.args['north'])
+        east = float(request.args['east'])
+        zoom = int(float(request.args['zoom']))
+    except (KeyError, ValueError):
+        return jsonify({"error": "south, west, north, east and zoom are required numeric values"}), 400
+
+    if not -90 <= south <= north <= 90 or not -180 <= west <= 180 or not -180 <= east <= 180 or zoom < 0:
+        return jsonify({"error": "Invalid viewport"}), 400
+
+    if zoom < INDIVIDUAL_EVENTS_ZOOM:
+        return jsonify({"zoom": zoom, "clusters": query_clusters(db, south, west, north, east, zoom), "events": []}), 200
+
+    events = db['events'].find(
+        {
+            "location": {"$geoWithin": {"$geometry": viewport_geometry(south, west, north, east)}},
+            "starts_at": {"$gte": today_start()}
+        },
+        {"name": 1, "description": 1, "date": 1, "lat": 1, "lng": 1}
+    ).limit(MAX_VIEWPORT_EVENTS)
+
+    events_list = [{
+        "id": event["_id"],
+        "name": event["name"],
+        "description": event["description"],
+        "date": event["date"],
+        "lat": event["lat"],
+        "lng": event["lng"]
+    } for event in events]
+
+    return jsonify({"zoom": zoom, "clusters": [], "events": events_list}), 200
 
 @volunteering.route('/events/<string:event_id>', methods=['GET'])
 @jwt_required()
+@cached_response(lambda event_id: f'event:{event_id}')
 def view_event(event_id):
     db = current_app.db
     event = db['events'].find_one({"_id": ObjectId(event_id)})
@@ -35,11 +151,13 @@ def view_event(event_id):
         return jsonify({"error": "Event not found"}), 404
 
     return jsonify({
-        "id": str(event["_id"]),
+        "id": event["_id"],
         "name": event["name"],
         "description": event["description"],
         "date": event["date"],
-        "organization_id": str(event["organization_id"])
+        "organization_id": event["org_id"],
+        "capacity": event.get("capacity"),
+        "seats_available": event.get("seats_available")
     }), 200
 
 @volunteering.route('/create-event', methods=['POST'])
@@ -49,134 +167,267 @@ def add_event():
     db = current_app.db
     org_id = get_jwt_identity()
 
-    
-    if not data.get("name") or not data.get("description") or not data.get("date") or not data.get("address"):
-        return jsonify({"error": "Event name, description, date, and address are required"}), 400
-
-    lat = data.get("lat")
-    lng = data.get("lng")
-    if (lat and not isinstance(lat, (float, int))) or (lng and not isinstance(lng, (float, int))):
-        return jsonify({"error": "Invalid latitude or longitude values"}), 400
-    
-    event = {
-        "name": data["name"],
-        "description": data["description"],
-        "date": data["date"],
-        "address": data["address"],
-        "lat": lat,
-        "lng": lng,
-        "org_id": ObjectId(org_id)
-    }
+    try:
+        event = build_event(data, org_id)
+    except InvalidEvent as e:
+        return jsonify({"error": str(e)}), 400
 
-    result = db['events'].insert_one(event)
+    result = db['events'].insert_one(mark_tiled(event))
 
     if not result.inserted_id:
         return jsonify({"error": "Failed to create event"}), 500
-    
-    update_result = db['organizations'].update_one(
-        {"_id": ObjectId(org_id)},
-        {"$addToSet": {"created_events": {"id": str(result.inserted_id), "name": event["name"], "date": event["date"]}}}
-    )
 
-    if not update_result.matched_count:
-        db['events'].delete_one({"_id": result.inserted_id})  
-        return jsonify({"error": "Failed to update organization events"}), 500
+    index_event(db, event)
+    current_app.feed_updater.events_added([event])
+    invalidate('events')
 
     return jsonify({
         "message": "Event created successfully",
-        "event_id": str(result.inserted_id),
+        "event_id": result.inserted_id,
         "org_id": org_id
     }), 201
 
+@volunteering.route('/events/import', methods=['POST'])
+@jwt_required()
+def import_events():
+    db = current_app.db
+    config = current_app.config
+    org_id = get_jwt_identity()
+
+    # current_user is resolved from the database, so tokens issued before the
+    # userType claim existed still identify organizations
+    if not current_user or current_user['userType'] != "organization":
+        return jsonify({"error": "Only organizations can import events"}), 403
+
+    fmt = import_format(request)
+    if fmt is None:
+        return jsonify({"error": "Upload text/csv or application/x-ndjson, or pass format=csv|ndjson"}), 415
+
+    length = request.content_length
+    if length is not None and length > config['IMPORT_MAX_BYTES']:
+        return jsonify({"error": f"Uploads are limited to {config['IMPORT_MAX_BYTES']} bytes"}), 413
+
+    if request.args.get('background') == 'true' or length is None or length > config['IMPORT_SYNC_MAX_BYTES']:
+        try:
+            path = spool(request.stream, config['IMPORT_MAX_BYTES'], config['IMPORT_SPOOL_DIR'])
+        except ImportFailed as e:
+            return jsonify({"error": str(e)}), 413
+        job_id = current_app.import_jobs.start(current_app._get_current_object(), org_id, fmt, path)
+        response = jsonify({"job_id": job_id, "status": QUEUED})
+        response.headers['Location'] = url_for('volunteering.import_job_status', job_id=str(job_id))
+        return response, 202
+
+    importer = EventImporter(db, org_id, config, on_insert=current_app.feed_updater.events_added)
+    try:
+        importer.run(read_rows(request.stream, fmt))
+    except ImportFailed as e:
+        return jsonify({"error": str(e), **importer.report()}), 400
+    finally:
+        if importer.inserted:
+            invalidate('events')
+
+    return jsonify(importer.report()), 201 if not importer.error_count else 207
+
+@volunteering.route('/events/import/<string:job_id>', methods=['GET'])
+@jwt_required()
+def import_job_status(job_id):
+    try:
+        job = current_app.import_jobs.get(job_id, get_jwt_identity())
+    except InvalidId:
+        job = None
+    if not job:
+        return jsonify({"error": "Import job not found"}), 404
+
+    return jsonify({
+        "job_id": job["_id"],
+        "status": job["status"],
+        "format": job["format"],
+        "rows": job["rows"],
+        "inserted": job["inserted"],
+        "error_count": job["error_count"],
+        "errors": job["errors"],
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+        "finished_at": job.get("finished_at")
+    }), 200
+
+def run_in_transaction(db, callback):
+    with db.client.start_session() as session:
+        return session.with_transaction(callback)
+
 @volunteering.route('/register-for-event/<string:event_id>/register', methods=['POST'])
 @jwt_required()
 def register_for_event(event_id):
     db = current_app.db
     user_id = get_jwt_identity()
+    claims = get_jwt()
 
-    
-    event = db['events'].find_one({"_id": ObjectId(event_id)})
+    try:
+        event = db['events'].find_one({"_id": ObjectId(event_id)}, EVENT_SUMMARY)
+    except InvalidId:
+        event = None
     if not event:
         return jsonify({"error": "Event not found"}), 404
 
-    if db['registrations'].find_one({"user_id": ObjectId(user_id), "event_id": ObjectId(event_id)}):
-        return jsonify({"error": "User already registered for this event"}), 400
-    
-    registration = {
-        "user_id": ObjectId(user_id),
-        "event_id": ObjectId(event_id),
-        "status": "registered"
-    }
-    registration_id = db['registrations'].insert_one(registration).inserted_id
-
-    update_result = db['users'].update_one(
-        {"_id": ObjectId(user_id)},
-        {"$addToSet": {"events": {"id": str(event["_id"]), "name": event["name"], "date": event["date"]}}}
-    )
+    status = REGISTERED
+    waitlist_position = None
+    if event.get("capacity") is not None and not claim_seat(db, event["_id"]):
+        status = WAITLISTED
+        waitlist_position = next_waitlist_position(db, event["_id"])
 
-    if not update_result.matched_count:
-        db['registrations'].delete_one({"_id": registration_id})  
-        return jsonify({"error": "Failed to update user events"}), 500
-    
-    org_id = str(event["org_id"])
-    user = db['users'].find_one({"_id": ObjectId(user_id)})
-    user_name = user.get("fullName", "A volunteer")  
+    user_name = claims.get("name") or "A volunteer"
     event_name = event.get("name", "an event")
-    message = f"{user_name} registered for your {event_name} volunteering event."
+    if status == REGISTERED:
+        message = f"{user_name} registered for your {event_name} volunteering event."
+    else:
+        message = f"{user_name} joined the waitlist for your {event_name} volunteering event."
 
-    try:
-        notification_service_url = current_app.config["NOTIFICATION_SERVICE_URL"]
-        notification_data = {
-            "org_id": org_id,
-            "message": message
+    def register(session):
+        registration = {
+            "user_id": ObjectId(user_id),
+            "event_id": event["_id"],
+            "event_name": event["name"],
+            "date": event["date"],
+            "starts_at": event.get("starts_at"),
+            "status": status
         }
-        response = requests.post(notification_service_url, json=notification_data)
+        if waitlist_position is not None:
+            registration["waitlist_position"] = waitlist_position
+        db['registrations'].insert_one(registration, session=session)
+
+        enqueue_notification(db, str(event["org_id"]), message, session=session)
+
+    def give_back_seat():
+        # the seat was claimed before the transaction, so it is returned
+        # whenever the registration does not commit
+        if status == REGISTERED and event.get("capacity") is not None:
+            release_seat(db, event["_id"])
+            promote_waitlist(db, event)
+
+    try:
+        run_in_transaction(db, register)
+    except DuplicateKeyError:
+        give_back_seat()
+        return jsonify({"error": "User already registered for this event"}), 400
+    except BaseException:
+        give_back_seat()
+        raise
+    finally:
+        if event.get("capacity") is not None:
+            invalidate(f'event:{event_id}')
+
+    current_app.feed_updater.registered(user_id, event)
 
-        if response.status_code != 201:
-            db['registrations'].delete_one({"_id": registration_id})
+    if status == WAITLISTED:
+        promoted = promote_waitlist(db, event)
+        if not any(registration["user_id"] == ObjectId(user_id) for registration in promoted):
             return jsonify({
-                "error": "Registration failed due to notification service error",
-                "details": response.json()
-            }), 500
-    except requests.exceptions.RequestException as e:
-        db['registrations'].delete_one({"_id": registration_id})
-        return jsonify({"error": "Registration failed due to notification service error", "details": str(e)}), 500
-
-    return jsonify({"message": "Successfully registered for the event"}), 201
-
-def calculate_distance(lat1, lng1, lat2, lng2):
-    R = 6371  
-    dlat = radians(lat2 - lat1)
-    dlng = radians(lng2 - lng1)
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
+                "message": "Event is full, you have been added to the waitlist",
+                "status": WAITLISTED,
+                "waitlist_position": waitlist_position
+            }), 201
+
+    return jsonify({"message": "Successfully registered for the event", "status": REGISTERED}), 201
+
+@volunteering.route('/register-for-event/<string:event_id>/register', methods=['DELETE'])
+@jwt_required()
+def cancel_registration(event_id):
+    db = current_app.db
+    user_id = get_jwt_identity()
+
+    try:
+        event_oid = ObjectId(event_id)
+    except InvalidId:
+        return jsonify({"error": "Registration not found"}), 404
+
+    registration, event = gather(
+        lambda: db['registrations'].find_one_and_delete({"user_id": ObjectId(user_id), "event_id": event_oid}),
+        lambda: db['events'].find_one({"_id": event_oid}, EVENT_SUMMARY)
+    )
+    if not registration:
+        return jsonify({"error": "Registration not found"}), 404
+
+    if registration["status"] == REGISTERED and event and event.get("capacity") is not None:
+        release_seat(db, event["_id"])
+        promote_waitlist(db, event)
+        invalidate(f'event:{event_id}')
+    if event:
+        current_app.feed_updater.cancelled(user_id, event)
+
+    return jsonify({"message": "Registration cancelled"}), 200
+
+@volunteering.route('/notification-outbox', methods=['GET'])
+@jwt_required()
+def notification_outbox_status():
+    if not current_user or current_user['email'].lower() not in current_app.config['OPERATOR_EMAILS']:
+        return jsonify({"error": "Operator access required"}), 403
+    return jsonify(current_app.notification_dispatcher.status()), 200
 
 @volunteering.route('/nearest-events', methods=['GET'])
 @jwt_required()
 def nearest_events():
     db = current_app.db
-    lat = float(request.args.get('lat'))
-    lng = float(request.args.get('lng'))
-
-    events = db['events'].find()
-    events_with_distance = []
-
-    for event in events:
-        event_lat = event.get('lat')
-        event_lng = event.get('lng')
-        if event_lat and event_lng:
-            distance = geodesic((lat, lng), (event_lat, event_lng)).miles
-            events_with_distance.append({
-                "id": str(event["_id"]),
-                "name": event["name"],
-                "description": event["description"],
-                "date": event["date"],
-                "lat": event_lat,
-                "lng": event_lng,
-                "distance": distance
-            })
-
-    events_with_distance.sort(key=lambda x: x["distance"])
-
-    return jsonify(events_with_distance), 200
\ No newline at end of file
+    max_radius = current_app.config['NEAREST_EVENTS_MAX_RADIUS']
+
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+        radius = min(float(request.args.get('radius') or max_radius), max_radius)
+        limit = parse_limit(request.args.get('limit'))
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat and lng are required; radius and limit must be numeric"}), 400
+
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180 or radius <= 0:
+        return jsonify({"error": "Invalid latitude, longitude or radius"}), 400
+
+    query = {}
+    if request.args.get('upcoming', 'true').lower() != 'false':
+        query["starts_at"] = {"$gte": today_start()}
+
+    geo_near = {
+        "near": {"type": "Point", "coordinates": [lng, lat]},
+        "distanceField": "distance",
+        "key": "location",
+        "spherical": True,
+        "maxDistance": radius * METERS_PER_MILE,
+        "query": query
+    }
+
+    pipeline = [{"$geoNear": geo_near}]
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            last_distance, last_id = decode_cursor(cursor, 2)
+            last_id = ObjectId(last_id)
+        except (InvalidCursor, InvalidId, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+        geo_near["minDistance"] = last_distance
+        pipeline.append({"$match": {"$or": [
+            {"distance": {"$gt": last_distance}},
+            {"distance": last_distance, "_id": {"$gt": last_id}}
+        ]}})
+
+    # $geoNear leaves events at the same distance in no particular order, so
+    # the keyset needs an explicit tie-break; maxDistance bounds the sort
+    pipeline.append({"$sort": {"distance": 1, "_id": 1}})
+    pipeline.append({"$limit": limit + 1})
+    pipeline.append({"$project": {"name": 1, "description": 1, "date": 1, "lat": 1, "lng": 1, "distance": 1}})
+
+    events = list(db['events'].aggregate(pipeline))
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_cursor = encode_cursor(events[-1]["distance"], str(events[-1]["_id"]))
+
+    events_with_distance = [{
+        "id": event["_id"],
+        "name": event["name"],
+        "description": event["description"],
+        "date": event["date"],
+        "lat": event["lat"],
+        "lng": event["lng"],
+        "distance": event["distance"] / METERS_PER_MILE
+    } for event in events]
+
+    return jsonify({"events": events_with_distance, "next_cursor": next_cursor}), 200
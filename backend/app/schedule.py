@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+from functools import partial
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from app.concurrency import gather
+from app.pagination import encode_cursor, decode_cursor, parse_limit, InvalidCursor
+
+UPCOMING = 'upcoming'
+PAST = 'past'
+
+def parse_event_date(value):
+    if not isinstance(value, str):
+        raise ValueError('date must be a string')
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def today_start():
+    # event dates are stored as naive UTC, so the day boundary is taken in UTC too
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+def schedule_page(collection, query, when, cursor, limit, projection, date_field='starts_at'):
+    today = today_start()
+    if when == UPCOMING:
+        query = {**query, date_field: {"$gte": today}}
+        direction, after = 1, "$gt"
+    else:
+        query = {**query, date_field: {"$lt": today}}
+        direction, after = -1, "$lt"
+
+    if cursor:
+        try:
+            last_date, last_id = decode_cursor(cursor, 2)
+            last_date, last_id = datetime.fromisoformat(last_date), ObjectId(last_id)
+        except (InvalidCursor, InvalidId, TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        query["$or"] = [
+            {date_field: {after: last_date}},
+            {date_field: last_date, "_id": {after: last_id}}
+        ]
+
+    documents = list(collection.find(query, projection).sort([(date_field, direction), ("_id", direction)]).limit(limit + 1))
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last[date_field].isoformat(), str(last["_id"]))
+    return documents, next_cursor
+
+def schedule_lists(collection, query, projection, serialize, args):
+    limit = parse_limit(args.get('limit'))
+    when = args.get('when')
+    if when not in (None, UPCOMING, PAST):
+        raise ValueError('when must be upcoming or past')
+
+    keys = [key for key in (PAST, UPCOMING) if not when or when == key]
+    pages = gather(*(
+        partial(schedule_page, collection, query, key, args.get(f'{key}_cursor'), limit, projection)
+        for key in keys
+    ))
+
+    result = {}
+    for key, (documents, next_cursor) in zip(keys, pages):
+        result[f'{key}_events'] = [serialize(document) for document in documents]
+        result[f'next_{key}_cursor'] = next_cursor
+    return result
@@ -0,0 +1,104 @@
+from datetime import timedelta
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from app.pagination import encode_cursor, decode_cursor, parse_limit, InvalidCursor
+from app.schedule import parse_event_date
+
+EARTH_RADIUS_MILES = 3963.2
+MAX_QUERY_LENGTH = 200
+DATE_BUCKETS = {
+    'day': '%Y-%m-%d',
+    'week': '%G-W%V',
+    'month': '%Y-%m'
+}
+
+def parse_search(args):
+    query = (args.get('q') or '').strip()
+    if not query:
+        raise ValueError('q is required')
+    if len(query) > MAX_QUERY_LENGTH:
+        raise ValueError(f'q must be at most {MAX_QUERY_LENGTH} characters')
+
+    bucket = args.get('bucket', 'month')
+    if bucket not in DATE_BUCKETS:
+        raise ValueError('bucket must be day, week or month')
+
+    filters = {}
+    starts = {}
+    try:
+        if args.get('from'):
+            starts['$gte'] = parse_event_date(args['from'])
+        if args.get('to'):
+            starts['$lt'] = parse_event_date(args['to']) + timedelta(days=1)
+    except ValueError:
+        raise ValueError('from and to must be ISO dates (YYYY-MM-DD)')
+    if starts:
+        filters['starts_at'] = starts
+
+    near = [args.get(name) for name in ('lat', 'lng', 'radius')]
+    if any(near):
+        try:
+            lat, lng, radius = (float(value) for value in near)
+        except (TypeError, ValueError):
+            raise ValueError('lat, lng and radius must be given together as numbers')
+        if not -90 <= lat <= 90 or not -180 <= lng <= 180 or radius <= 0:
+            raise ValueError('Invalid latitude, longitude or radius')
+        # $geoNear cannot follow $text, so distance is a $geoWithin filter
+        filters['location'] = {'$geoWithin': {'$centerSphere': [[lng, lat], radius / EARTH_RADIUS_MILES]}}
+
+    return {
+        'query': query,
+        'filters': filters,
+        'bucket': bucket,
+        'limit': parse_limit(args.get('limit')),
+        'cursor': args.get('cursor')
+    }
+
+def text_match(query):
+    return {'$text': {'$search': query}}
+
+def relevance_stages(cursor, limit):
+    stages = []
+    if cursor:
+        try:
+            last_score, last_id = decode_cursor(cursor, 2)
+            last_score, last_id = float(last_score), ObjectId(last_id)
+        except (InvalidCursor, InvalidId, TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        stages.append({'$match': {'$or': [
+            {'score': {'$lt': last_score}},
+            {'score': last_score, '_id': {'$gt': last_id}}
+        ]}})
+    return stages + [{'$sort': {'score': -1, '_id': 1}}, {'$limit': limit + 1}]
+
+def relevance_page(documents, limit):
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1]['score'], str(documents[-1]['_id']))
+    return documents, next_cursor
+
+def date_facet_stages(field, bucket):
+    return [
+        {'$match': {field: {'$type': 'date'}}},
+        {'$group': {'_id': {'$dateToString': {'format': DATE_BUCKETS[bucket], 'date': f'${field}'}}, 'count': {'$sum': 1}}},
+        {'$sort': {'_id': 1}}
+    ]
+
+def serialize_facets(buckets):
+    return [{'bucket': bucket['_id'], 'count': bucket['count']} for bucket in buckets]
+
+def search(collection, match, params, page_stages, facet_stages, filter_stages=()):
+    # the date facets cover every match, so they are only computed for the first page
+    pipeline = [{'$match': match}, {'$addFields': {'score': {'$meta': 'textScore'}}}, *filter_stages]
+    page = relevance_stages(params['cursor'], params['limit']) + page_stages
+
+    if params['cursor']:
+        documents = list(collection.aggregate(pipeline + page))
+        facets = None
+    else:
+        result = next(collection.aggregate(pipeline + [{'$facet': {'page': page, 'dates': facet_stages}}]))
+        documents, facets = result['page'], serialize_facets(result['dates'])
+
+    documents, next_cursor = relevance_page(documents, params['limit'])
+    return documents, next_cursor, facets
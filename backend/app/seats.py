@@ -0,0 +1,49 @@
+from pymongo import ReturnDocument
+from app.outbox import enqueue_notification
+
+REGISTERED = 'registered'
+WAITLISTED = 'waitlisted'
+REGISTRATION_KEY = [("user_id", 1), ("event_id", 1)]
+
+def claim_seat(db, event_id):
+    return db['events'].find_one_and_update(
+        {"_id": event_id, "seats_available": {"$gt": 0}},
+        {"$inc": {"seats_available": -1}},
+        projection={"_id": 1}
+    ) is not None
+
+def release_seat(db, event_id):
+    db['events'].update_one({"_id": event_id}, {"$inc": {"seats_available": 1}})
+
+def next_waitlist_position(db, event_id):
+    event = db['events'].find_one_and_update(
+        {"_id": event_id},
+        {"$inc": {"waitlist_seq": 1}},
+        projection={"waitlist_seq": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return event["waitlist_seq"]
+
+def promote_waitlist(db, event):
+    # keeps moving the head of the waitlist into free seats; also called
+    # after every waitlist insert so a seat freed in between is not lost
+    promoted = []
+    while claim_seat(db, event["_id"]):
+        registration = db['registrations'].find_one_and_update(
+            {"event_id": event["_id"], "status": WAITLISTED},
+            {"$set": {"status": REGISTERED}, "$unset": {"waitlist_position": ""}},
+            sort=[("waitlist_position", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if registration is None:
+            release_seat(db, event["_id"])
+            break
+
+        user = db['users'].find_one({"_id": registration["user_id"]}, {"fullName": 1})
+        user_name = (user or {}).get("fullName") or "A volunteer"
+        enqueue_notification(
+            db, str(event["org_id"]),
+            f"{user_name} moved from the waitlist to registered for your {event['name']} volunteering event."
+        )
+        promoted.append(registration)
+    return promoted
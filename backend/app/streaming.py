@@ -0,0 +1,24 @@
+from flask import Response, current_app, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+EXPORT_BATCH_SIZE = 500
+
+def wants_stream(request):
+    return request.args.get('format') in ('ndjson', 'json-stream') or \
+        request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+def stream_response(request, cursor, serialize):
+    cursor = cursor.batch_size(EXPORT_BATCH_SIZE)
+
+    if request.args.get('format') == 'json-stream':
+        def generate():
+            yield '['
+            for index, document in enumerate(cursor):
+                yield (',' if index else '') + current_app.json.dumps(serialize(document))
+            yield ']'
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
+    def generate():
+        for document in cursor:
+            yield current_app.json.dumps(serialize(document)) + '\n'
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
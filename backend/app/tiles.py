@@ -0,0 +1,200 @@
+from datetime import datetime, timedelta, timezone
+from math import floor, log, tan, cos, pi, radians
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from app.schedule import today_start
+
+MAX_TILE_ZOOM = 15
+CLUSTER_ZOOM_OFFSET = 2
+INDIVIDUAL_EVENTS_ZOOM = 14
+MAX_MERCATOR_LAT = 85.05112878
+SWEEP_LEASE = timedelta(hours=1)
+
+def tile_for(lat, lng, zoom):
+    n = 2 ** zoom
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = int(floor((lng + 180.0) / 360.0 * n))
+    y = int(floor((1.0 - log(tan(radians(lat)) + 1.0 / cos(radians(lat))) / pi) / 2.0 * n))
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def mark_tiled(event):
+    # only upcoming events are counted; the tile ids are kept on the event so
+    # expire_tiles can take it back out of the same tiles once it has passed
+    lat, lng = event.get("lat"), event.get("lng")
+    starts_at = event.get("starts_at")
+    if lat is None or lng is None or not isinstance(starts_at, datetime) or starts_at < today_start():
+        return event
+
+    tiles = []
+    for zoom in range(MAX_TILE_ZOOM + 1):
+        x, y = tile_for(lat, lng, zoom)
+        tiles.append(f"{zoom}/{x}/{y}")
+    event["tiles"] = tiles
+    return event
+
+def representative_of(event):
+    return {
+        "id": str(event["_id"]),
+        "name": event["name"],
+        "date": event["date"],
+        "lat": event["lat"],
+        "lng": event["lng"]
+    }
+
+def tile_updates(event):
+    if not event.get("tiles"):
+        return []
+
+    lat, lng = event["lat"], event["lng"]
+    representative = representative_of(event)
+    updates = []
+    for tile_id in event["tiles"]:
+        zoom, x, y = (int(part) for part in tile_id.split('/'))
+        updates.append(UpdateOne(
+            {"_id": tile_id},
+            {
+                "$inc": {"count": 1, "lat_sum": lat, "lng_sum": lng},
+                "$setOnInsert": {"zoom": zoom, "x": x, "y": y, "event": representative}
+            },
+            upsert=True
+        ))
+    return updates
+
+def expiry_updates(event):
+    return [
+        UpdateOne({"_id": tile_id}, {"$inc": {"count": -1, "lat_sum": -event["lat"], "lng_sum": -event["lng"]}})
+        for tile_id in event["tiles"]
+    ]
+
+def index_event(db, event):
+    updates = tile_updates(event)
+    if updates:
+        db['event_tiles'].bulk_write(updates, ordered=False)
+
+def create_tile_indexes(collection):
+    collection.create_index([("zoom", 1), ("y", 1), ("x", 1)])
+    collection.create_index([("event.id", 1)])
+
+def replace_representatives(db, event_ids):
+    # tiles that still count events but showed one that has passed get another
+    # upcoming event from the same tile as their representative
+    for tile in db['event_tiles'].find({"event.id": {"$in": [str(event_id) for event_id in event_ids]}}, {"_id": 1}):
+        event = db['events'].find_one(
+            {"tiles": tile["_id"], "tile_sweep": {"$exists": False}}, {"name": 1, "date": 1, "lat": 1, "lng": 1}
+        )
+        if event:
+            db['event_tiles'].update_one({"_id": tile["_id"]}, {"$set": {"event": representative_of(event)}})
+
+def expire_tiles(db, batch_size=500):
+    # each sweep claims the passed events with its own token, so sweeps running
+    # in several workers never decrement an event twice; claims older than
+    # SWEEP_LEASE belong to a sweep that died and are taken over
+    token = ObjectId()
+    stale = ObjectId.from_datetime(datetime.now(timezone.utc) - SWEEP_LEASE)
+    db['events'].update_many(
+        {
+            "tiles": {"$exists": True},
+            "starts_at": {"$lt": today_start()},
+            "$or": [{"tile_sweep": {"$exists": False}}, {"tile_sweep": {"$lt": stale}}]
+        },
+        {"$set": {"tile_sweep": token}}
+    )
+
+    expired = 0
+    while True:
+        events = list(db['events'].find({"tile_sweep": token}, {"lat": 1, "lng": 1, "tiles": 1}).limit(batch_size))
+        if not events:
+            break
+        event_ids = [event["_id"] for event in events]
+        db['event_tiles'].bulk_write([update for event in events for update in expiry_updates(event)], ordered=False)
+        db['events'].update_many({"_id": {"$in": event_ids}}, {"$unset": {"tiles": "", "tile_sweep": ""}})
+        db['event_tiles'].delete_many({"count": {"$lte": 0}})
+        replace_representatives(db, event_ids)
+        expired += len(events)
+    return expired
+
+def rebuild_tiles(db, batch_size=500):
+    # builds the index into a scratch collection and renames it over the live
+    # one, so the map keeps serving the old tiles until the new ones are ready
+    started = ObjectId()
+    scratch = db['event_tiles_rebuild']
+    scratch.drop()
+    events = db['events'].find(
+        {"_id": {"$lt": started}, "starts_at": {"$gte": today_start()}, "location": {"$exists": True}},
+        {"name": 1, "date": 1, "lat": 1, "lng": 1, "starts_at": 1}
+    )
+
+    updates = []
+    marks = []
+    indexed = 0
+    for event in events:
+        mark_tiled(event)
+        if not event.get("tiles"):
+            continue
+        updates.extend(tile_updates(event))
+        marks.append(UpdateOne({"_id": event["_id"]}, {"$set": {"tiles": event["tiles"]}, "$unset": {"tile_sweep": ""}}))
+        indexed += 1
+        if len(updates) >= batch_size:
+            scratch.bulk_write(updates, ordered=False)
+            db['events'].bulk_write(marks, ordered=False)
+            updates, marks = [], []
+    if updates:
+        scratch.bulk_write(updates, ordered=False)
+        db['events'].bulk_write(marks, ordered=False)
+
+    create_tile_indexes(scratch)
+    swapped = ObjectId()
+    scratch.rename('event_tiles', dropTarget=True)
+
+    # events created while the scratch collection was filling were counted in
+    # the tiles that were just replaced, so they are added to the new ones
+    for event in db['events'].find({"_id": {"$gte": started, "$lt": swapped}, "tiles": {"$exists": True}}):
+        index_event(db, event)
+        indexed += 1
+    db['events'].update_many(
+        {"starts_at": {"$lt": today_start()}, "tiles": {"$exists": True}},
+        {"$unset": {"tiles": "", "tile_sweep": ""}}
+    )
+    return indexed
+
+def tile_ranges(south, west, north, east, zoom):
+    x0, y0 = tile_for(north, west, zoom)
+    x1, y1 = tile_for(south, east, zoom)
+    if west <= east:
+        x_ranges = [(x0, x1)]
+    else:
+        x_ranges = [(x0, 2 ** zoom - 1), (0, x1)]
+    return x_ranges, (y0, y1)
+
+def query_clusters(db, south, west, north, east, zoom):
+    tile_zoom = min(zoom + CLUSTER_ZOOM_OFFSET, MAX_TILE_ZOOM)
+    x_ranges, (y0, y1) = tile_ranges(south, west, north, east, tile_zoom)
+    # expire_tiles decrements counts before it deletes empty tiles
+    query = {"zoom": tile_zoom, "y": {"$gte": y0, "$lte": y1}, "count": {"$gt": 0}}
+    if len(x_ranges) == 1:
+        query["x"] = {"$gte": x_ranges[0][0], "$lte": x_ranges[0][1]}
+    else:
+        query["$or"] = [{"x": {"$gte": lo, "$lte": hi}} for lo, hi in x_ranges]
+
+    clusters = []
+    for tile in db['event_tiles'].find(query):
+        clusters.append({
+            "id": tile["_id"],
+            "count": tile["count"],
+            "lat": tile["lat_sum"] / tile["count"],
+            "lng": tile["lng_sum"] / tile["count"],
+            "event": tile["event"]
+        })
+    return clusters
+
+def box_ring(south, west, north, east):
+    return [[[west, south], [east, south], [east, north], [west, north], [west, south]]]
+
+def viewport_geometry(south, west, north, east):
+    # a viewport crossing the antimeridian is split into two boxes, as in tile_ranges
+    if west <= east:
+        return {"type": "Polygon", "coordinates": box_ring(south, west, north, east)}
+    return {
+        "type": "MultiPolygon",
+        "coordinates": [box_ring(south, west, north, 180.0), box_ring(south, -180.0, north, east)]
+    }
@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from app.metrics import WORKER_POOL_PENDING, WORKER_TASK_DURATION
+
+class PoolSaturated(Exception):
+    pass
+
+class BoundedProcessPool:
+    def __init__(self, max_workers, max_pending, name=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def get_executor(self):
+        # a pool inherited through fork is unusable, so each process builds its own
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                # workers already run background threads, and forking them can
+                # leave a lock held in the child, so tasks run in forkserver children
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context('forkserver')
+                )
+                self.pid = os.getpid()
+            return self.executor
+
+    def release(self, future):
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
+        if self.name:
+            WORKER_POOL_PENDING.labels(self.name).dec()
+
+    def submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PoolSaturated()
+        with self.lock:
+            self.pending += 1
+        if self.name:
+            WORKER_POOL_PENDING.labels(self.name).inc()
+        try:
+            future = self.get_executor().submit(fn, *args)
+        except Exception:
+            self.release(None)
+            raise
+        future.add_done_callback(self.release)
+        return future
+
+    def run(self, fn, *args, timeout=None):
+        started = time.perf_counter()
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise PoolSaturated()
+        finally:
+            if self.name:
+                WORKER_TASK_DURATION.labels(self.name).observe(time.perf_counter() - started)
+
+    def queue_depth(self):
+        with self.lock:
+            return self.pending
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None and self.pid == os.getpid():
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,93 @@
+"""Stress-test event capacity and waitlist promotion against MONGO_URI.
+
+Seeds one event with --capacity seats and --users volunteers who all
+register at once, then cancels --cancel registered volunteers at once,
+checking after each phase that the seat counter, registered count and
+waitlist agree. Run from the backend directory:
+
+    python -m benchmarks.capacity --users 500 --capacity 50 --concurrency 64
+"""
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from bson.objectid import ObjectId
+
+os.environ.setdefault('NOTIFICATION_DISPATCHER_ENABLED', 'false')
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from benchmarks.registrations import cleanup
+
+def check(db, event_id, capacity, users, phase):
+    event = db['events'].find_one({"_id": event_id})
+    statuses = Counter(r["status"] for r in db['registrations'].find({"event_id": event_id}, {"status": 1}))
+    positions = [r["waitlist_position"] for r in db['registrations'].find(
+        {"event_id": event_id, "status": "waitlisted"}, {"waitlist_position": 1})]
+
+    expected_registered = min(capacity, users)
+    ok = (
+        statuses["registered"] == expected_registered
+        and event["seats_available"] == capacity - expected_registered
+        and len(positions) == len(set(positions)) == users - expected_registered
+    )
+    print(f'{phase}: registered={statuses["registered"]} waitlisted={statuses["waitlisted"]} '
+          f'seats_available={event["seats_available"]} -> {"OK" if ok else "INCONSISTENT"}')
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--capacity', type=int, default=50)
+    parser.add_argument('--cancel', type=int, default=25)
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+
+    app = create_app()
+    db = app.db
+    org_id = ObjectId()
+    event_id = db['events'].insert_one({
+        "name": "Capacity benchmark", "description": "Seeded by benchmarks.capacity", "date": "2999-01-01",
+        "address": "", "lat": None, "lng": None, "org_id": org_id,
+        "capacity": args.capacity, "seats_available": args.capacity, "waitlist_seq": 0
+    }).inserted_id
+    user_ids = db['users'].insert_many([
+        {"email": f"bench-{ObjectId()}@example.com", "fullName": f"Volunteer {i}", "userType": "volunteer"}
+        for i in range(args.users)
+    ]).inserted_ids
+
+    try:
+        with app.app_context():
+            tokens = {user_id: create_access_token(identity=str(user_id), additional_claims={'userType': 'volunteer'})
+                      for user_id in user_ids}
+
+        def call(method, user_id):
+            client = app.test_client()
+            response = client.open(f'/volunteering/register-for-event/{event_id}/register', method=method,
+                                   headers={'Authorization': f'Bearer {tokens[user_id]}'})
+            return response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            statuses = Counter(executor.map(lambda user_id: call('POST', user_id), user_ids))
+        elapsed = time.perf_counter() - started
+        print(f'register: {args.users} requests in {elapsed:.2f}s ({args.users / elapsed:.1f}/s), status codes {dict(statuses)}')
+        ok = check(db, event_id, args.capacity, args.users, 'after registration')
+
+        registered = [r["user_id"] for r in db['registrations'].find(
+            {"event_id": event_id, "status": "registered"}, {"user_id": 1}).limit(args.cancel)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            list(executor.map(lambda user_id: call('DELETE', user_id), registered))
+        elapsed = time.perf_counter() - started
+        print(f'cancel: {len(registered)} requests in {elapsed:.2f}s')
+        ok = check(db, event_id, args.capacity, args.users - len(registered), 'after cancellation') and ok
+
+        if not ok:
+            raise SystemExit(1)
+    finally:
+        cleanup(db, org_id, event_id, user_ids)
+
+if __name__ == '__main__':
+    main()
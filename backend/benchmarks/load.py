@@ -0,0 +1,301 @@
+"""Load-test both services with a seeded synthetic dataset.
+
+Seeds users, organizations, events with coordinates, registrations and
+notifications (tagged so they can be removed afterwards), drives each
+scenario with concurrent HTTP clients against running servers and writes
+one JSON report that can be diffed between commits:
+
+    gunicorn                                  # backend, from backend/
+    gunicorn                                  # notification service, from notif_server/
+    python -m benchmarks.load --users 2000 --events 5000 --requests 1000 \\
+        --concurrency 32 --output load-$(git rev-parse --short HEAD).json
+
+Mongo ops per request come from the serverStatus opcounters of each
+service's database server, so point MONGO_URI and MICROSERVICE_MONGO_URI
+at a local mongod that serves no other traffic. Registration runs in a
+transaction, so the mongod must be a (single-node) replica set.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+from werkzeug.security import generate_password_hash
+import requests
+
+os.environ.setdefault('NOTIFICATION_DISPATCHER_ENABLED', 'false')
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from app.schedule import today_start
+from app.tiles import rebuild_tiles
+
+PASSWORD = 'load-test-password'
+CENTER = (40.7128, -74.0060)
+SPREAD_DEGREES = 0.5
+
+def seed(db, notification_db, args, run_id, password_hash):
+    rng = random.Random(args.seed)
+    today = today_start()
+
+    org_ids = db['organizations'].insert_many([{
+        'email': f'load-{run_id}-org-{index}@example.com',
+        'password': password_hash,
+        'name': f'Load organization {index}',
+        'description': 'Seeded by benchmarks.load',
+        'image': None,
+        'load_run': run_id
+    } for index in range(args.orgs)]).inserted_ids
+
+    user_ids = db['users'].insert_many([{
+        'email': f'load-{run_id}-user-{index}@example.com',
+        'password': password_hash,
+        'userType': 'volunteer',
+        'fullName': f'Volunteer {index}',
+        'dob': '1990-01-01',
+        'description': 'Seeded by benchmarks.load',
+        'image': None,
+        'load_run': run_id
+    } for index in range(args.users)]).inserted_ids
+
+    events = []
+    for index in range(args.events):
+        starts_at = today + timedelta(days=rng.randint(-60, 120))
+        lat = CENTER[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES)
+        lng = CENTER[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES)
+        events.append({
+            'name': f'Load event {index}',
+            'description': 'Seeded by benchmarks.load',
+            'date': starts_at.strftime('%Y-%m-%d'),
+            'starts_at': starts_at,
+            'address': '',
+            'lat': lat,
+            'lng': lng,
+            'location': {'type': 'Point', 'coordinates': [lng, lat]},
+            'org_id': rng.choice(org_ids),
+            'load_run': run_id
+        })
+    db['events'].insert_many(events)
+
+    pairs = set()
+    while len(pairs) < min(args.registrations, args.users * args.events):
+        pairs.add((rng.randrange(args.users), rng.randrange(args.events)))
+    if pairs:
+        db['registrations'].insert_many([{
+            'user_id': user_ids[user],
+            'event_id': events[event]['_id'],
+            'event_name': events[event]['name'],
+            'date': events[event]['date'],
+            'starts_at': events[event]['starts_at'],
+            'status': 'registered'
+        } for user, event in pairs])
+
+    notifications = [{
+        'organization_id': str(rng.choice(org_ids)),
+        'message': f'Load notification {index}',
+        'status': rng.choice(('unread', 'read')),
+        'load_run': run_id
+    } for index in range(args.notifications)]
+    if notifications:
+        notification_db.notifications.insert_many(notifications)
+    unread = Counter(n['organization_id'] for n in notifications if n['status'] == 'unread')
+    for org_id in map(str, org_ids):
+        notification_db.notification_counters.update_one({'_id': org_id}, {'$set': {'unread': unread[org_id]}}, upsert=True)
+
+    return org_ids, user_ids, [event['_id'] for event in events]
+
+def cleanup(db, notification_db, run_id, org_ids, user_ids, event_ids):
+    db['registrations'].delete_many({'event_id': {'$in': event_ids}})
+    db['user_feeds'].delete_many({'user_id': {'$in': user_ids}})
+    db['user_org_affinity'].delete_many({'user_id': {'$in': user_ids}})
+    db['events'].delete_many({'load_run': run_id})
+    db['users'].delete_many({'load_run': run_id})
+    db['organizations'].delete_many({'load_run': run_id})
+    db['notification_outbox'].delete_many({'org_id': {'$in': [str(org_id) for org_id in org_ids]}})
+    notification_db.notifications.delete_many({'load_run': run_id})
+    notification_db.notification_counters.delete_many({'_id': {'$in': [str(org_id) for org_id in org_ids]}})
+
+def scenarios(args, rng, backend, notifications, tokens, org_ids, event_ids, user_count):
+    user_tokens, org_tokens = tokens
+    # each event is registered for once before pairs may repeat; repeats and
+    # seeded pairs show up as 400s in status_codes
+    register_pairs = iter([(rng.randrange(user_count), event_id) for event_id in rng.sample(event_ids, len(event_ids))])
+
+    def nearest(session):
+        lat = CENTER[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES)
+        lng = CENTER[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES)
+        return session.get(f'{backend}/volunteering/nearest-events', params={'lat': lat, 'lng': lng, 'radius': 10, 'limit': 20})
+
+    def login(session):
+        index = rng.randrange(user_count)
+        return session.post(f'{backend}/users/login', json={'email': f'load-{args.run_id}-user-{index}@example.com', 'password': PASSWORD})
+
+    def register(session):
+        user, event_id = next(register_pairs, (rng.randrange(user_count), rng.choice(event_ids)))
+        return session.post(f'{backend}/volunteering/register-for-event/{event_id}/register', headers=user_tokens[user])
+
+    def list_events(session):
+        return session.get(f'{backend}/volunteering/events', params={'limit': 20}, headers=rng.choice(user_tokens))
+
+    def view_event(session):
+        return session.get(f'{backend}/volunteering/events/{rng.choice(event_ids)}', headers=rng.choice(user_tokens))
+
+    def my_events(session):
+        return session.get(f'{backend}/users/get_my_events', params={'limit': 20}, headers=rng.choice(user_tokens))
+
+    def org_events(session):
+        return session.get(f'{backend}/organizations/get_my_events', params={'limit': 20}, headers=rng.choice(org_tokens))
+
+    def inbox(session):
+        return session.get(f'{notifications}/notifications/{rng.choice(org_ids)}', params={'limit': 20})
+
+    def unread_count(session):
+        return session.get(f'{notifications}/notifications/{rng.choice(org_ids)}/unread_count')
+
+    return [
+        ('nearest_events', 'backend', nearest),
+        ('login', 'backend', login),
+        ('register_for_event', 'backend', register),
+        ('list_events', 'backend', list_events),
+        ('view_event', 'backend', view_event),
+        ('user_my_events', 'backend', my_events),
+        ('org_my_events', 'backend', org_events),
+        ('notification_inbox', 'notifications', inbox),
+        ('unread_count', 'notifications', unread_count),
+    ]
+
+def opcounters(client):
+    counters = client.admin.command('serverStatus')['opcounters']
+    return sum(counters[name] for name in ('insert', 'query', 'update', 'delete', 'getmore', 'command'))
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+def run_scenario(scenario, total, concurrency, mongo_client):
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def call(_):
+        started = time.perf_counter()
+        try:
+            status = scenario(session).status_code
+        except requests.exceptions.RequestException:
+            status = 'error'
+        return status, time.perf_counter() - started
+
+    ops_before = opcounters(mongo_client)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(call, range(total)))
+    elapsed = time.perf_counter() - started
+    ops = opcounters(mongo_client) - ops_before
+
+    statuses = Counter(str(status) for status, _ in results)
+    latencies = sorted(latency for _, latency in results)
+    return {
+        'requests': total,
+        'errors': sum(count for status, count in statuses.items() if not status.startswith('2')),
+        'status_codes': dict(statuses),
+        'throughput_rps': round(total / elapsed, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2)
+        },
+        'mongo_ops_per_request': round(ops / total, 2)
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--notifications-url', default=os.getenv('NOTIFICATION_SERVICE_URL', 'http://127.0.0.1:5001'))
+    parser.add_argument('--notifications-mongo-uri', default=os.getenv('MICROSERVICE_MONGO_URI'))
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--orgs', type=int, default=100)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--registrations', type=int, default=10000)
+    parser.add_argument('--notifications', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--only', help='comma-separated scenario names')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+    args.run_id = ObjectId()
+
+    app = create_app()
+    db = app.db
+    notification_client = MongoClient(args.notifications_mongo_uri) if args.notifications_mongo_uri else app.mongo_client
+    notification_db = notification_client.get_database('microserviceDB')
+    password_hash = generate_password_hash(PASSWORD, method=app.config['PASSWORD_HASH_METHOD'])
+
+    started = time.perf_counter()
+    org_ids, user_ids, event_ids = seed(db, notification_db, args, args.run_id, password_hash)
+    rebuild_tiles(db)
+    seed_seconds = time.perf_counter() - started
+
+    try:
+        with app.app_context():
+            user_tokens = [
+                {'Authorization': f"Bearer {create_access_token(identity=str(user_id), additional_claims={'userType': 'volunteer', 'name': 'Load'})}"}
+                for user_id in user_ids
+            ]
+            org_tokens = [
+                {'Authorization': f"Bearer {create_access_token(identity=str(org_id), additional_claims={'userType': 'organization', 'name': 'Load'})}"}
+                for org_id in org_ids
+            ]
+
+        rng = random.Random(args.seed)
+        selected = set(args.only.split(',')) if args.only else None
+        servers = {'backend': app.mongo_client, 'notifications': notification_client}
+        report = {
+            'revision': git_revision(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'dataset': {
+                'users': args.users,
+                'orgs': args.orgs,
+                'events': args.events,
+                'registrations': args.registrations,
+                'notifications': args.notifications,
+                'seed_seconds': round(seed_seconds, 2)
+            },
+            'requests_per_scenario': args.requests,
+            'concurrency': args.concurrency,
+            'endpoints': {}
+        }
+        for name, server, scenario in scenarios(
+            args, rng, args.backend_url.rstrip('/'), args.notifications_url.rstrip('/'),
+            (user_tokens, org_tokens), [str(org_id) for org_id in org_ids], event_ids, len(user_ids)
+        ):
+            if selected and name not in selected:
+                continue
+            report['endpoints'][name] = run_scenario(scenario, args.requests, args.concurrency, servers[server])
+            print(f"{name:<20} {report['endpoints'][name]['throughput_rps']:>8} req/s  "
+                  f"p99 {report['endpoints'][name]['latency_ms']['p99']:>8} ms", file=sys.stderr)
+    finally:
+        cleanup(db, notification_db, args.run_id, org_ids, user_ids, event_ids)
+        rebuild_tiles(db)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Measure login throughput of the password hash policy.
+
+Run from the backend directory:
+
+    python -m benchmarks.password_hashing --method pbkdf2:sha256:600000 --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import wait
+from werkzeug.security import generate_password_hash, check_password_hash
+from app.workers import BoundedProcessPool
+
+def single_core_rate(stored_hash, password, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        check_password_hash(stored_hash, password)
+    return rounds / (time.perf_counter() - start)
+
+def pool_rate(stored_hash, password, rounds, workers):
+    pool = BoundedProcessPool(workers, rounds)
+    pool.run(check_password_hash, stored_hash, password)
+
+    start = time.perf_counter()
+    futures = [pool.submit(check_password_hash, stored_hash, password) for _ in range(rounds)]
+    wait(futures)
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    return rounds / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--method', default=os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    password = 'benchmark-password'
+    stored_hash = generate_password_hash(password, method=args.method)
+
+    single = single_core_rate(stored_hash, password, args.rounds)
+    pooled = pool_rate(stored_hash, password, args.rounds * args.workers, args.workers)
+
+    print(f'method:              {args.method}')
+    print(f'single core:         {single:.1f} logins/sec ({1000 / single:.0f} ms per verification)')
+    print(f'pool ({args.workers} workers):    {pooled:.1f} logins/sec, {pooled / args.workers:.1f} per core')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Measure concurrent event registrations against the configured MONGO_URI.
+
+Seeds one event and --users volunteers, has every volunteer register
+--attempts times concurrently, checks that exactly one attempt per
+volunteer succeeded, then removes the seeded data. Run from the backend
+directory:
+
+    python -m benchmarks.registrations --users 500 --concurrency 32
+"""
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from bson.objectid import ObjectId
+
+os.environ.setdefault('NOTIFICATION_DISPATCHER_ENABLED', 'false')
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+
+def seed(db, users):
+    org_id = ObjectId()
+    event_id = db['events'].insert_one({
+        "name": "Benchmark event",
+        "description": "Seeded by benchmarks.registrations",
+        "date": "2999-01-01",
+        "address": "",
+        "lat": None,
+        "lng": None,
+        "org_id": org_id
+    }).inserted_id
+    user_ids = db['users'].insert_many([
+        {"email": f"bench-{ObjectId()}@example.com", "fullName": f"Volunteer {i}", "userType": "volunteer"}
+        for i in range(users)
+    ]).inserted_ids
+    return org_id, event_id, user_ids
+
+def cleanup(db, org_id, event_id, user_ids):
+    db['registrations'].delete_many({"event_id": event_id})
+    db['notification_outbox'].delete_many({"org_id": str(org_id)})
+    db['users'].delete_many({"_id": {"$in": user_ids}})
+    db['user_feeds'].delete_many({"user_id": {"$in": user_ids}})
+    db['user_org_affinity'].delete_many({"user_id": {"$in": user_ids}})
+    db['events'].delete_one({"_id": event_id})
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--attempts', type=int, default=2, help='concurrent registrations per volunteer')
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    app = create_app()
+    db = app.db
+    org_id, event_id, user_ids = seed(db, args.users)
+
+    try:
+        with app.app_context():
+            tokens = {
+                user_id: create_access_token(
+                    identity=str(user_id), additional_claims={'userType': 'volunteer', 'name': 'Benchmark'}
+                )
+                for user_id in user_ids
+            }
+
+        def register(user_id):
+            client = app.test_client()
+            started = time.perf_counter()
+            response = client.post(
+                f'/volunteering/register-for-event/{event_id}/register',
+                headers={'Authorization': f'Bearer {tokens[user_id]}'}
+            )
+            return user_id, response.status_code, time.perf_counter() - started
+
+        jobs = [user_id for user_id in user_ids for _ in range(args.attempts)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            results = list(executor.map(register, jobs))
+        elapsed = time.perf_counter() - started
+
+        statuses = Counter(status for _, status, _ in results)
+        successes = Counter(user_id for user_id, status, _ in results if status == 201)
+        latencies = sorted(latency for _, _, latency in results)
+        stored = db['registrations'].count_documents({"event_id": event_id})
+
+        print(f'requests:        {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.1f} req/s)')
+        print(f'registrations:   {sum(successes.values())} ({sum(successes.values()) / elapsed:.1f}/s), stored {stored}')
+        print(f'status codes:    {dict(statuses)}')
+        print(f'latency p50/p95: {latencies[len(latencies) // 2] * 1000:.1f} / {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms')
+        if stored != args.users or any(count != 1 for count in successes.values()):
+            print('ERROR: expected exactly one registration per volunteer')
+    finally:
+        cleanup(db, org_id, event_id, user_ids)
+
+if __name__ == '__main__':
+    main()
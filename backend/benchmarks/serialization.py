@@ -0,0 +1,68 @@
+"""Compare response encoding cost and size for an event listing payload.
+
+Run from the backend directory:
+
+    python -m benchmarks.serialization --events 500 --rounds 200
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+from flask import Flask
+from app.compression import brotli
+from app.json_provider import MongoJSONProvider, mongo_default, orjson
+
+def synthetic_events(count):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [{
+        'id': ObjectId(),
+        'name': f'Community event {index}',
+        'description': 'Volunteers needed to sort donations and serve meals. ' * 3,
+        'date': (start + timedelta(days=index % 90)).strftime('%Y-%m-%d'),
+        'starts_at': start + timedelta(days=index % 90),
+        'organization_id': ObjectId(),
+        'organization': {'id': ObjectId(), 'name': f'Organization {index % 40}', 'image': f'/media/{index:064x}?size=64'},
+        'lat': 40.7 + random.random(),
+        'lng': -74.0 + random.random(),
+        'capacity': 50,
+        'seats_taken': index % 50
+    } for index in range(count)]
+
+def stdlib_dumps(payload):
+    return json.dumps(payload, default=mongo_default)
+
+def timed(encode, payload, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        body = encode(payload)
+    return (time.process_time() - start) / rounds * 1000, body.encode('utf-8')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--gzip-level', type=int, default=6)
+    parser.add_argument('--brotli-quality', type=int, default=5)
+    args = parser.parse_args()
+
+    payload = {'events': synthetic_events(args.events), 'next_after': None}
+    provider = MongoJSONProvider(Flask(__name__))
+
+    print(f'payload:  {args.events} events, orjson {"enabled" if orjson else "not installed"}')
+    for label, encode in (('stdlib json', stdlib_dumps), ('provider', provider.dumps)):
+        encode_ms, body = timed(encode, payload, args.rounds)
+        start = time.process_time()
+        gzipped = gzip.compress(body, compresslevel=args.gzip_level)
+        gzip_ms = (time.process_time() - start) * 1000
+        line = f'{label:<12} encode {encode_ms:7.2f} ms  raw {len(body):>8} B  gzip {len(gzipped):>7} B ({gzip_ms:.2f} ms)'
+        if brotli is not None:
+            start = time.process_time()
+            compressed = brotli.compress(body, quality=args.brotli_quality)
+            line += f'  br {len(compressed):>7} B ({(time.process_time() - start) * 1000:.2f} ms)'
+        print(line)
+
+if __name__ == '__main__':
+    main()
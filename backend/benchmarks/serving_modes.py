@@ -0,0 +1,109 @@
+"""Compare the sync (gthread) and async (gevent) serving modes.
+
+Starts gunicorn once per worker class with the same --workers, seeds an
+organization with past and upcoming events, and drives concurrent
+GET /organizations/get_my_events requests (two independent schedule
+queries per request) at each server. Run from the backend directory:
+
+    python -m benchmarks.serving_modes --workers 2 --concurrency 64 --requests 5000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from bson.objectid import ObjectId
+import requests
+
+os.environ.setdefault('NOTIFICATION_DISPATCHER_ENABLED', 'false')
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from app.schedule import today_start
+
+def seed(db, events):
+    org_id = ObjectId()
+    today = today_start()
+    db['events'].insert_many([{
+        "name": f"Benchmark event {index}",
+        "description": "Seeded by benchmarks.serving_modes",
+        "date": (today + timedelta(days=index - events // 2)).strftime('%Y-%m-%d'),
+        "starts_at": today + timedelta(days=index - events // 2),
+        "address": "",
+        "org_id": org_id
+    } for index in range(events)])
+    return org_id
+
+def start_server(worker_class, workers, port):
+    env = {
+        **os.environ,
+        'WEB_WORKER_CLASS': worker_class,
+        'WEB_WORKERS': str(workers),
+        'WEB_BIND': f'127.0.0.1:{port}'
+    }
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn'], env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/readyz', timeout=1).status_code == 200:
+                return server
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f'{worker_class} server did not become ready')
+
+def drive(port, token, total, concurrency):
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    url = f'http://127.0.0.1:{port}/organizations/get_my_events'
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def call(_):
+        started = time.perf_counter()
+        status = session.get(url, headers=headers, timeout=30).status_code
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(call, range(total)))
+    return results, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    app = create_app()
+    db = app.db
+    org_id = seed(db, args.events)
+
+    try:
+        with app.app_context():
+            token = create_access_token(identity=str(org_id), additional_claims={'userType': 'organization'})
+
+        for worker_class in ('gthread', 'gevent'):
+            server = start_server(worker_class, args.workers, args.port)
+            try:
+                drive(args.port, token, args.concurrency, args.concurrency)
+                results, elapsed = drive(args.port, token, args.requests, args.concurrency)
+            finally:
+                server.terminate()
+                server.wait()
+
+            errors = sum(1 for status, _ in results if status != 200)
+            latencies = sorted(latency for _, latency in results)
+            print(f'{worker_class:<8} {args.workers} workers: {len(results) / elapsed:8.1f} req/s  '
+                  f'p50 {latencies[len(latencies) // 2] * 1000:6.1f} ms  '
+                  f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.1f} ms  errors {errors}')
+    finally:
+        db['events'].delete_many({"org_id": org_id})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.config import Config
+
+wsgi_app = 'run:app'
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS
+# gthread blocks one thread per request; gevent makes pymongo, redis and
+# requests calls cooperative so one worker serves many requests at once
+worker_class = Config.WEB_WORKER_CLASS
+threads = Config.WEB_THREADS
+worker_connections = Config.WEB_WORKER_CONNECTIONS
+timeout = Config.WEB_TIMEOUT
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+keepalive = Config.WEB_KEEPALIVE
+max_requests = Config.WEB_MAX_REQUESTS
+max_requests_jitter = Config.WEB_MAX_REQUESTS_JITTER
+
+# each worker imports run.py after the fork, so create_app builds its own
+# MongoClient, process pools and background threads per worker
+preload_app = False
+
+def when_ready(server):
+    if workers > 1 and not Config.CACHE_REDIS_URL:
+        server.log.warning('%s workers without CACHE_REDIS_URL: cache invalidations only reach the worker that made them', workers)
+
+def post_fork(server, worker):
+    server.log.info('worker %s forked, connecting on first request', worker.pid)
+
+def child_exit(server, worker):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
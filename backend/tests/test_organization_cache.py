@@ -0,0 +1,46 @@
+import os
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('pymongo')
+if not os.getenv('MONGO_URI'):
+    pytest.skip('MONGO_URI is not set', allow_module_level=True)
+
+os.environ.setdefault('NOTIFICATION_DISPATCHER_ENABLED', 'false')
+os.environ.setdefault('FEED_COMPACTOR_ENABLED', 'false')
+
+from bson.objectid import ObjectId
+from flask_jwt_extended import create_access_token
+from app import create_app
+
+@pytest.fixture
+def app():
+    app = create_app()
+    yield app
+    app.import_jobs.stop_sweeper()
+
+def test_signup_clears_cached_org_list(app):
+    db = app.db
+    user_id = db['users'].insert_one({'email': f'cache-test-{ObjectId()}@gmail.com', 'fullName': 'Cache Test'}).inserted_id
+    email = f'cache-test-{ObjectId()}@gmail.com'
+    with app.app_context():
+        token = create_access_token(identity=str(user_id), additional_claims={'userType': 'volunteer'})
+    headers = {'Authorization': f'Bearer {token}'}
+    # only organizations created after this marker are listed, so the first
+    # request caches an empty page that the signup has to clear
+    url = f'/organizations/get_all_orgs?after={ObjectId()}'
+    client = app.test_client()
+
+    try:
+        assert client.get(url, headers=headers).get_json()['organizations'] == []
+
+        response = client.post('/organizations/signup', data={
+            'name': 'Cache Test', 'email': email, 'password': 'cache-test-password', 'description': 'Cache test'
+        })
+        assert response.status_code == 200
+
+        organizations = client.get(url, headers=headers).get_json()['organizations']
+        assert [organization['email'] for organization in organizations] == [email]
+    finally:
+        db['users'].delete_one({'_id': user_id})
+        db['organizations'].delete_one({'email': email})
@@ -26,7 +26,10 @@ export default function EditProfilePage() {
           userType === "volunteer"
             ? `${API_URL}/users/get_user_by_id/${authData.id}`
             : `${API_URL}/organizations/get_org_by_id/${authData.id}`;
-        const response = await axios.get(endpoint, { withCredentials: true });
+        const response = await axios.get(endpoint, {
+          params: { size: 256 },
+          withCredentials: true,
+        });
         const data = response.data.user || response.data;
 
         setUser((prev) => ({
@@ -37,7 +40,7 @@ export default function EditProfilePage() {
           address: data.address || "",
         }));
 
-        if (data.image) setImagePreview(`data:image/jpeg;base64,${data.image}`);
+        if (data.image) setImagePreview(`${API_URL}${data.image}`);
       } catch (err) {
         setError("Failed to load profile. Please try again.");
       }
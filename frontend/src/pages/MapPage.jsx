@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useContext } from "react";
+import React, { useState, useEffect, useContext, useRef } from "react";
 import { GoogleMap, LoadScript, Marker, InfoWindow } from "@react-google-maps/api";
 import axios from "axios";
 import EventPreview from "../components/EventPreview";
@@ -7,8 +7,10 @@ import { AuthContext } from "../context/authContext";
 const MapPage = () => {
   const [selectedEvent, setSelectedEvent] = useState(null);
   const [currentLocation, setCurrentLocation] = useState(null);
-  const [nearestEvents, setNearestEvents] = useState([]);
+  const [viewportEvents, setViewportEvents] = useState([]);
+  const [clusters, setClusters] = useState([]);
   const [eventMessages, setEventMessages] = useState({}); 
+  const mapRef = useRef(null);
 
   const { userType } = useContext(AuthContext);
   const API_URL = process.env.REACT_APP_API_URL;
@@ -22,26 +24,48 @@ const MapPage = () => {
         async (position) => {
           const { latitude, longitude } = position.coords;
           setCurrentLocation({ lat: latitude, lng: longitude });
-          await fetchNearestEvents(latitude, longitude);
         },
         (error) => console.error("Error fetching location:", error)
       );
     };
 
-    const fetchNearestEvents = async (lat, lng) => {
-      try {
-        const response = await axios.get(`${API_URL}/volunteering/nearest-events`, {
-          params: { lat, lng },
-          withCredentials: true, 
-        });
-        setNearestEvents(response.data);
-      } catch (error) {
-        console.error("Error fetching nearest events:", error);
-      }
-    };
-
     fetchLocation();
-  }, [API_URL]);
+  }, []);
+
+  const fetchViewport = async () => {
+    const map = mapRef.current;
+    const bounds = map && map.getBounds();
+    if (!bounds) return;
+
+    const northEast = bounds.getNorthEast();
+    const southWest = bounds.getSouthWest();
+    try {
+      const response = await axios.get(`${API_URL}/volunteering/events/viewport`, {
+        params: {
+          south: southWest.lat(),
+          west: southWest.lng(),
+          north: northEast.lat(),
+          east: northEast.lng(),
+          zoom: map.getZoom(),
+        },
+        withCredentials: true, 
+      });
+      setClusters(response.data.clusters);
+      setViewportEvents(response.data.events);
+    } catch (error) {
+      console.error("Error fetching events in viewport:", error);
+    }
+  };
+
+  const handleClusterClick = (cluster) => {
+    const map = mapRef.current;
+    if (cluster.count === 1) {
+      setSelectedEvent(cluster.event);
+      return;
+    }
+    map.panTo({ lat: cluster.lat, lng: cluster.lng });
+    map.setZoom(map.getZoom() + 2);
+  };
 
   const handleJoinEvent = async (eventId) => {
     try {
@@ -72,6 +96,8 @@ const MapPage = () => {
             mapContainerClassName="w-full h-full"
             center={center}
             zoom={12}
+            onLoad={(map) => (mapRef.current = map)}
+            onIdle={fetchViewport}
           >
             {currentLocation && (
               <Marker
@@ -80,7 +106,16 @@ const MapPage = () => {
               />
             )}
 
-            {nearestEvents.map((event) => (
+            {clusters.map((cluster) => (
+              <Marker
+                key={cluster.id}
+                position={{ lat: cluster.lat, lng: cluster.lng }}
+                label={cluster.count > 1 ? String(cluster.count) : undefined}
+                onClick={() => handleClusterClick(cluster)}
+              />
+            ))}
+
+            {viewportEvents.map((event) => (
               <Marker
                 key={event.id}
                 position={{ lat: event.lat, lng: event.lng }}
@@ -15,7 +15,7 @@ const NotificationsPage = () => {
       try {
         setLoading(true);
         const response = await axios.get(`${API_URL}/notifications/${authData.id}`);
-        setNotifications(response.data);
+        setNotifications(response.data.notifications);
       } catch (err) {
         setError("Failed to fetch notifications. Please try again.");
       } finally {
@@ -28,6 +28,20 @@ const NotificationsPage = () => {
     }
   }, [API_URL, authData]);
 
+  useEffect(() => {
+    if (!authData?.id) return;
+
+    const source = new EventSource(`${API_URL}/notifications/${authData.id}/stream`);
+    source.addEventListener("notification", (event) => {
+      const notification = JSON.parse(event.data);
+      setNotifications((prev) =>
+        prev.some((existing) => existing.id === notification.id) ? prev : [notification, ...prev]
+      );
+    });
+
+    return () => source.close();
+  }, [API_URL, authData]);
+
   if (loading) {
     return (
       <div className="flex items-center justify-center min-h-screen bg-white">
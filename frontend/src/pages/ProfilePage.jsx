@@ -21,7 +21,10 @@ const ProfilePage = () => {
             ? `${API_URL}/users/get_user_by_id/${authData.id}`
             : `${API_URL}/organizations/get_org_by_id/${authData.id}`;
 
-        const response = await axios.get(endpoint, { withCredentials: true });
+        const response = await axios.get(endpoint, {
+          params: { size: 256 },
+          withCredentials: true,
+        });
         setProfileData(response.data.user || response.data); 
       } catch (err) {
         setError("Failed to load profile. Please try again.");
@@ -61,7 +64,7 @@ const ProfilePage = () => {
         {profileData?.image && (
           <div className="flex justify-center">
             <img
-              src={`data:image/jpeg;base64,${profileData.image}`}
+              src={`${API_URL}${profileData.image}`}
               alt="Profile"
               className="w-32 h-32 rounded-full object-cover border-4 border-white"
             />
@@ -1,73 +1,413 @@
-from flask import Flask, request, jsonify
-from pymongo import MongoClient
-from pymongo.errors import PyMongoError
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
+import atexit
+import click
+import json
+import time
+from flask import Flask, request, jsonify, Response, stream_with_context
+from pymongo import UpdateOne, DESCENDING, ReturnDocument
+from pymongo.errors import PyMongoError, BulkWriteError
+from bson.errors import InvalidId
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from config import Config
 from dotenv import load_dotenv
 from bson import ObjectId
 from flask_cors import CORS
+from write_behind import WriteBehindBuffer, BufferFull
+from pubsub import NotificationBroker, start_tailer
+from json_provider import MongoJSONProvider
+from compression import init_compression
+from mongo import PoolMonitor, create_client, check_readiness
+from metrics import init_metrics, mongo_listeners
+from profiling import init_profiling
 
 load_dotenv()
 
 app = Flask(__name__)
+app.json = MongoJSONProvider(app)
 app.config.from_object(Config)
 CORS(app)
+init_compression(app)
+init_metrics(app)
+init_profiling(app)
 
-mongo_client = MongoClient(app.config["MONGO_URI"])
+mongo_pool = PoolMonitor(app.config["MONGO_MAX_POOL_SIZE"])
+mongo_client = create_client(app.config["MONGO_URI"], app.config, [mongo_pool, *mongo_listeners(app.config)])
 notification_db = mongo_client.get_database("microserviceDB")
+notification_db.notifications.create_index([("organization_id", 1), ("_id", DESCENDING)])
+notification_db.notifications.create_index([("organization_id", 1), ("status", 1), ("_id", DESCENDING)])
+notification_db.notifications.create_index([("organization_id", 1), ("seq", 1)])
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1), retry=retry_if_exception_type(PyMongoError))
-def insert_notification(notification):
-    return notification_db.notifications.insert_one(notification)
+DUPLICATE_KEY_ERROR = 11000
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
 
-@app.route('/notifications', methods=['POST'])
-def send_notification():
-    data = request.get_json()
+broker = NotificationBroker(app.config["STREAM_QUEUE_SIZE"])
+if app.config["CHANGE_STREAM_ENABLED"]:
+    tailer_stop = start_tailer(notification_db.notifications, broker)
+    atexit.register(tailer_stop.set)
+
+def serialize_notification(notification):
+    return {
+        "id": notification["_id"],
+        "organization_id": notification.get("organization_id"),
+        "message": notification["message"],
+        "status": notification["status"],
+        "seq": notification.get("seq")
+    }
+
+def after_insert(notifications):
+    if not app.config["CHANGE_STREAM_ENABLED"]:
+        for notification in notifications:
+            broker.publish(notification)
+
+def run_in_transaction(callback):
+    with mongo_client.start_session() as session:
+        return session.with_transaction(callback)
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.1, max=2), retry=retry_if_exception_type(PyMongoError), reraise=True)
+def insert_chunk(chunk):
+    # the notifications and their unread counters are written in one
+    # transaction, so the counters cannot drift from the collection. Each
+    # notification also takes the next number of its organization's sequence
+    # from the counter; a second writer for the same organization conflicts on
+    # that document until this one commits, so sequence order is commit order
+    def write(session):
+        by_org = {}
+        for notification in chunk:
+            by_org.setdefault(notification["organization_id"], []).append(notification)
+        for org_id, notifications in by_org.items():
+            counter = notification_db.notification_counters.find_one_and_update(
+                {"_id": org_id},
+                {"$inc": {"unread": len(notifications), "seq": len(notifications)}},
+                upsert=True, return_document=ReturnDocument.AFTER, session=session
+            )
+            first = counter["seq"] - len(notifications) + 1
+            for offset, notification in enumerate(notifications):
+                notification["seq"] = first + offset
+        notification_db.notifications.insert_many(chunk, session=session)
+
+    try:
+        run_in_transaction(write)
+    except BulkWriteError as e:
+        # _id is assigned client-side and a chunk commits as a whole, so a
+        # duplicate means an earlier attempt already committed all of it
+        if not all(error["code"] == DUPLICATE_KEY_ERROR for error in e.details["writeErrors"]):
+            return set(range(len(chunk)))
+        stored = {
+            notification["_id"]: notification["seq"]
+            for notification in notification_db.notifications.find({"_id": {"$in": [n["_id"] for n in chunk]}}, {"seq": 1})
+        }
+        for notification in chunk:
+            notification["seq"] = stored.get(notification["_id"])
+    return set()
+
+def insert_notifications(notifications):
+    chunk_size = app.config["BATCH_CHUNK_SIZE"]
+    failed = set()
+    for start in range(0, len(notifications), chunk_size):
+        chunk = notifications[start:start + chunk_size]
+        chunk_failed = insert_chunk(chunk)
+        after_insert([notification for index, notification in enumerate(chunk) if index not in chunk_failed])
+        failed.update(start + index for index in chunk_failed)
+    return failed
+
+def rebuild_unread_counters():
+    # recounts in one transaction: an insert or read landing meanwhile touches
+    # the same counter documents, so one of the two conflicts and is retried
+    def rebuild(session):
+        counts = {row["_id"]: row["unread"] for row in notification_db.notifications.aggregate([
+            {"$match": {"status": "unread"}},
+            {"$group": {"_id": "$organization_id", "unread": {"$sum": 1}}}
+        ], session=session)}
+        org_ids = set(counts) | set(notification_db.notification_counters.distinct("_id", session=session))
+        if org_ids:
+            notification_db.notification_counters.bulk_write([
+                UpdateOne({"_id": org_id}, {"$set": {"unread": counts.get(org_id, 0)}}, upsert=True)
+                for org_id in org_ids
+            ], session=session)
+        return len(counts)
+    return run_in_transaction(rebuild)
+
+@app.cli.command("rebuild-unread-counters")
+def rebuild_unread_counters_command():
+    click.echo(f"Recounted unread notifications for {rebuild_unread_counters()} organizations")
+
+# counters only track changes, so they are seeded once from the notifications
+# already stored when the service first runs against a database
+if not notification_db.notification_counters.estimated_document_count():
+    rebuild_unread_counters()
+
+write_behind = None
+if app.config["WRITE_BEHIND_ENABLED"]:
+    write_behind = WriteBehindBuffer(
+        insert_notifications,
+        app.config["WRITE_BEHIND_MAX_SIZE"],
+        app.config["WRITE_BEHIND_FLUSH_INTERVAL"],
+        app.config["WRITE_BEHIND_MAX_PENDING"]
+    )
+    atexit.register(write_behind.close)
+
+def build_notification(data):
+    if not isinstance(data, dict):
+        return None
     org_id = data.get('org_id')
     message = data.get('message')
-
     if not org_id or not message:
-        return jsonify({"error": "Organization ID and message are required"}), 400
-
-    notification = {
+        return None
+    return {
+        "_id": ObjectId(),
         "organization_id": org_id,
         "message": message,
         "status": "unread"
     }
 
+def read_batch_items():
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+        return
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError("Request body must be a JSON array or NDJSON stream")
+    yield from data
+
+@app.route('/healthz', methods=['GET'])
+def liveness():
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readiness():
+    ready, status = check_readiness(mongo_client, mongo_pool, app.config["READINESS_TIMEOUT"])
+    status["status"] = "ready" if ready else "unavailable"
+    return jsonify(status), 200 if ready else 503
+
+@app.route('/notifications/batch', methods=['POST'])
+def send_notifications_batch():
+    notifications = []
+    indexes = []
+    errors = []
+
+    try:
+        for index, item in enumerate(read_batch_items()):
+            if index >= app.config["MAX_BATCH_SIZE"]:
+                return jsonify({"error": f"Batch exceeds {app.config['MAX_BATCH_SIZE']} notifications"}), 413
+            notification = build_notification(item)
+            if notification is None:
+                errors.append({"index": index, "error": "Organization ID and message are required"})
+            else:
+                notifications.append(notification)
+                indexes.append(index)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
-        result = insert_notification(notification)
-        if result.inserted_id:
-            return jsonify({"message": "Notification sent successfully", "id": str(result.inserted_id)}), 201
-        else:
+        failed = insert_notifications(notifications)
+    except PyMongoError:
+        return jsonify({"error": "Failed to send notifications after retries"}), 500
+
+    errors.extend({"index": indexes[i], "error": "Failed to insert notification"} for i in failed)
+    inserted_ids = [notification["_id"] for i, notification in enumerate(notifications) if i not in failed]
+
+    errors.sort(key=lambda error: error["index"])
+    return jsonify({
+        "inserted": len(inserted_ids),
+        "ids": inserted_ids,
+        "errors": errors
+    }), 201 if not errors else 207
+
+@app.route('/notifications', methods=['POST'])
+def send_notification():
+    data = request.get_json()
+    notification = build_notification(data)
+
+    if notification is None:
+        return jsonify({"error": "Organization ID and message are required"}), 400
+
+    if write_behind is not None:
+        try:
+            write_behind.add(notification)
+        except BufferFull:
+            response = jsonify({"error": "Notification buffer is full, please retry"})
+            response.headers["Retry-After"] = "1"
+            return response, 503
+        return jsonify({"message": "Notification queued", "id": notification["_id"]}), 202
+
+    try:
+        if insert_chunk([notification]):
             return jsonify({"error": "Failed to insert notification"}), 500
+        after_insert([notification])
+        return jsonify({"message": "Notification sent successfully", "id": notification["_id"]}), 201
     except PyMongoError:
         return jsonify({"error": "Failed to send notification after retries"}), 500
 
 @app.route('/notifications/<string:org_id>', methods=['GET'])
 def get_notifications_by_org(org_id):
+    query = {"organization_id": org_id}
+
+    status = request.args.get('status')
+    if status:
+        query["status"] = status
+
     try:
-        print(f"Fetching notifications for organization_id: {org_id}")  # Log the org_id
-        notifications = notification_db.notifications.find({"organization_id": org_id})
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        before = request.args.get('before')
+        if before:
+            query["_id"] = {"$lt": ObjectId(before)}
+    except (ValueError, InvalidId):
+        return jsonify({"error": "limit must be an integer and before a notification ID"}), 400
 
-        result = [
-            {
-                "id": str(notification["_id"]),
-                "organization_id": notification.get("organization_id"),
-                "message": notification["message"],
-                "status": notification["status"]
-            }
-            for notification in notifications
-        ]
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
 
-        print(f"Query result: {result}")  # Log the query results
+    try:
+        notifications = notification_db.notifications.find(query).sort("_id", DESCENDING).limit(limit)
 
-        if not result:
-            return jsonify({"message": "No notifications found for the organization"}), 200
+        result = [serialize_notification(notification) for notification in notifications]
 
-        return jsonify(result), 200
+        next_before = result[-1]["id"] if len(result) == limit else None
+        return jsonify({"notifications": result, "next_before": next_before}), 200
 
     except PyMongoError:
         return jsonify({"error": "Failed to retrieve notifications"}), 500
-    except Exception as e:
-        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@app.route('/notifications/<string:org_id>/unread_count', methods=['GET'])
+def get_unread_count(org_id):
+    try:
+        counter = notification_db.notification_counters.find_one({"_id": org_id})
+    except PyMongoError:
+        return jsonify({"error": "Failed to retrieve unread count"}), 500
+
+    return jsonify({"organization_id": org_id, "unread_count": counter["unread"] if counter else 0}), 200
+
+@app.route('/notifications/<string:org_id>/read', methods=['POST'])
+def mark_notifications_read(org_id):
+    data = request.get_json(silent=True) or {}
+    query = {"organization_id": org_id, "status": "unread"}
+
+    if data.get('ids'):
+        try:
+            query["_id"] = {"$in": [ObjectId(notification_id) for notification_id in data['ids']]}
+        except (InvalidId, TypeError):
+            return jsonify({"error": "Invalid notification ID"}), 400
+
+    def mark_read(session):
+        result = notification_db.notifications.update_many(query, {"$set": {"status": "read"}}, session=session)
+        if result.modified_count:
+            notification_db.notification_counters.update_one(
+                {"_id": org_id}, {"$inc": {"unread": -result.modified_count}}, upsert=True, session=session
+            )
+        return result.modified_count
+
+    try:
+        updated = run_in_transaction(mark_read)
+    except PyMongoError:
+        return jsonify({"error": "Failed to update notifications"}), 500
+
+    return jsonify({"message": "Notifications marked as read", "updated": updated}), 200
+
+def notifications_after(org_id, after_seq, limit=MAX_PAGE_SIZE):
+    return list(notification_db.notifications.find(
+        {"organization_id": org_id, "seq": {"$gt": after_seq}}
+    ).sort("seq", 1).limit(limit))
+
+def all_notifications_after(org_id, after_seq):
+    while True:
+        page = notifications_after(org_id, after_seq)
+        yield from page
+        if len(page) < MAX_PAGE_SIZE:
+            return
+        after_seq = page[-1]["seq"]
+
+def current_seq(org_id):
+    counter = notification_db.notification_counters.find_one({"_id": org_id}, {"seq": 1})
+    return (counter or {}).get("seq", 0)
+
+def parse_seq(value):
+    seq = int(value)
+    if seq < 0:
+        raise ValueError("sequence numbers are not negative")
+    return seq
+
+def sse_event(notification):
+    return f"id: {notification['seq']}\nevent: notification\ndata: {app.json.dumps(serialize_notification(notification))}\n\n"
+
+@app.route('/notifications/<string:org_id>/stream', methods=['GET'])
+def stream_notifications(org_id):
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        last_seq = parse_seq(last_event_id) if last_event_id else None
+    except ValueError:
+        # ids sent before sequence numbers existed cannot be resumed from
+        last_seq = None
+
+    heartbeat = app.config["STREAM_HEARTBEAT_INTERVAL"]
+
+    def generate(subscription):
+        yield f"retry: {app.config['STREAM_RETRY_MS']}\n\n"
+
+        sent_seq = current_seq(org_id) if last_seq is None else last_seq
+        for notification in all_notifications_after(org_id, sent_seq):
+            sent_seq = notification["seq"]
+            yield sse_event(notification)
+
+        while not subscription.overflowed:
+            notification = subscription.get(heartbeat)
+            if notification is None:
+                yield ": keep-alive\n\n"
+            elif notification["seq"] == sent_seq + 1:
+                sent_seq = notification["seq"]
+                yield sse_event(notification)
+            elif notification["seq"] > sent_seq:
+                # published out of order by another thread; everything up to
+                # it has committed, so the gap is read back from the database
+                for missed in all_notifications_after(org_id, sent_seq):
+                    sent_seq = missed["seq"]
+                    yield sse_event(missed)
+
+    # subscribe before replaying so nothing inserted in between is missed
+    subscription = broker.subscribe(org_id)
+    response = Response(stream_with_context(generate(subscription)), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    response.call_on_close(subscription.close)
+    return response
+
+@app.route('/notifications/<string:org_id>/poll', methods=['GET'])
+def poll_notifications(org_id):
+    try:
+        after = parse_seq(request.args['after']) if request.args.get('after') else None
+        timeout = min(float(request.args.get('timeout', app.config["LONG_POLL_TIMEOUT"])), app.config["LONG_POLL_TIMEOUT"])
+    except ValueError:
+        return jsonify({"error": "after must be a sequence number and timeout a number"}), 400
+
+    with broker.subscribe(org_id) as subscription:
+        try:
+            if after is None:
+                after = current_seq(org_id)
+            result = notifications_after(org_id, after)
+        except PyMongoError:
+            return jsonify({"error": "Failed to retrieve notifications"}), 500
+
+        deadline = time.monotonic() + timeout
+        while not result:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            notification = subscription.get(remaining)
+            if notification is None or notification["seq"] <= after:
+                continue
+            try:
+                result = notifications_after(org_id, after)
+            except PyMongoError:
+                return jsonify({"error": "Failed to retrieve notifications"}), 500
+
+    notifications = [serialize_notification(notification) for notification in result]
+    next_after = notifications[-1]["seq"] if notifications else after
+    return jsonify({"notifications": notifications, "next_after": next_after}), 200
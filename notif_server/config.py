@@ -1,4 +1,41 @@
 import os
 
 class Config:
-    MONGO_URI = os.getenv("MICROSERVICE_MONGO_URI")
\ No newline at end of file
+    MONGO_URI = os.getenv("MICROSERVICE_MONGO_URI")
+    BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", 500))
+    MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 10000))
+    WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+    WRITE_BEHIND_MAX_SIZE = int(os.getenv("WRITE_BEHIND_MAX_SIZE", 200))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 0.5))
+    WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 10000))
+    CHANGE_STREAM_ENABLED = os.getenv("CHANGE_STREAM_ENABLED", "false").lower() == "true"
+    STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 100))
+    STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", 15))
+    STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", 3000))
+    LONG_POLL_TIMEOUT = float(os.getenv("LONG_POLL_TIMEOUT", 25))
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+    READINESS_TIMEOUT = float(os.getenv("READINESS_TIMEOUT", 2))
+    MONGO_SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", 100))
+    WEB_BIND = os.getenv("WEB_BIND", "0.0.0.0:5001")
+    # without the change stream a worker only pushes the notifications it inserted itself
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", (os.cpu_count() or 1) if CHANGE_STREAM_ENABLED else 1))
+    WEB_WORKER_CONNECTIONS = int(os.getenv("WEB_WORKER_CONNECTIONS", 10000))
+    WEB_TIMEOUT = int(os.getenv("WEB_TIMEOUT", 30))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+    WEB_KEEPALIVE = int(os.getenv("WEB_KEEPALIVE", 5))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+    PROFILE_SECRET = os.getenv("PROFILE_SECRET")
+    PROFILE_TOKEN_TTL = int(os.getenv("PROFILE_TOKEN_TTL", 3600))
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 0))
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5))
+    PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", 200))
@@ -0,0 +1,31 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import Config
+
+wsgi_app = "app:app"
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS
+worker_class = "gevent"
+worker_connections = Config.WEB_WORKER_CONNECTIONS
+timeout = Config.WEB_TIMEOUT
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+keepalive = Config.WEB_KEEPALIVE
+
+# app.py is imported after the fork and after gevent patches the worker,
+# so each worker creates its own MongoClient, broker and flush thread
+preload_app = False
+
+def when_ready(server):
+    if workers > 1 and not Config.CHANGE_STREAM_ENABLED:
+        server.log.warning("%s workers without CHANGE_STREAM_ENABLED: streams only see notifications inserted by their own worker", workers)
+
+def post_fork(server, worker):
+    server.log.info("worker %s forked, connecting on first request", worker.pid)
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
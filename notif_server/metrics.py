@@ -0,0 +1,163 @@
+# this module is copied verbatim between backend/app and notif_server; change both copies together
+import logging
+import os
+import threading
+import time
+from flask import Response, g, request
+from pymongo import monitoring
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+logger = logging.getLogger(__name__)
+
+MONGO_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+DOCUMENT_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Request duration by endpoint',
+    ['method', 'endpoint', 'status']
+)
+MONGO_COMMAND_DURATION = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command duration',
+    ['command', 'collection'], buckets=MONGO_BUCKETS
+)
+MONGO_COMMAND_DOCUMENTS = Histogram(
+    'mongodb_command_documents', 'Documents returned or affected per MongoDB command',
+    ['command', 'collection'], buckets=DOCUMENT_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter(
+    'mongodb_command_failures_total', 'Failed MongoDB commands',
+    ['command', 'collection']
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    'mongodb_pool_connections', 'MongoDB pool connections',
+    ['state'], multiprocess_mode='livesum'
+)
+MONGO_POOL_WAIT_TIMEOUTS = Counter(
+    'mongodb_pool_wait_timeouts_total', 'Requests that timed out waiting for a pooled MongoDB connection'
+)
+HTTP_CLIENT_DURATION = Histogram(
+    'http_client_request_duration_seconds', 'Outbound HTTP request duration',
+    ['target', 'status']
+)
+WORKER_POOL_PENDING = Gauge(
+    'worker_pool_pending_tasks', 'Tasks queued or running in a process pool',
+    ['pool'], multiprocess_mode='livesum'
+)
+WORKER_TASK_DURATION = Histogram(
+    'worker_pool_task_duration_seconds', 'Process pool task duration including queueing',
+    ['pool']
+)
+
+def command_collection(event):
+    target = event.command.get('collection' if event.command_name == 'getMore' else event.command_name)
+    return target if isinstance(target, str) else '-'
+
+def returned_documents(reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+    if 'value' in reply:
+        return 1 if reply['value'] else 0
+    if isinstance(reply.get('n'), int):
+        return reply['n']
+    return None
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self, slow_query_ms):
+        self.slow_query_ms = slow_query_ms
+        self.lock = threading.Lock()
+        self.collections = {}
+
+    def started(self, event):
+        with self.lock:
+            self.collections[(event.request_id, event.connection_id)] = command_collection(event)
+
+    def finished(self, event):
+        with self.lock:
+            collection = self.collections.pop((event.request_id, event.connection_id), '-')
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection).observe(seconds)
+        return collection, seconds * 1000
+
+    def succeeded(self, event):
+        collection, elapsed_ms = self.finished(event)
+        documents = returned_documents(event.reply)
+        if documents is not None:
+            MONGO_COMMAND_DOCUMENTS.labels(event.command_name, collection).observe(documents)
+        if elapsed_ms >= self.slow_query_ms:
+            logger.warning(
+                'Slow MongoDB %s on %s.%s: %.1f ms, %s documents',
+                event.command_name, event.database_name, collection, elapsed_ms, documents
+            )
+
+    def failed(self, event):
+        collection, elapsed_ms = self.finished(event)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+        logger.warning(
+            'MongoDB %s on %s.%s failed after %.1f ms: %s',
+            event.command_name, event.database_name, collection, elapsed_ms, event.failure.get('errmsg')
+        )
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels('open').inc()
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels('open').dec()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CONNECTIONS.labels('checked_out').inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CONNECTIONS.labels('checked_out').dec()
+
+    def connection_check_out_failed(self, event):
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            MONGO_POOL_WAIT_TIMEOUTS.inc()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+def mongo_listeners(config):
+    return [CommandMetrics(config['MONGO_SLOW_QUERY_MS']), PoolMetrics()]
+
+def metrics_view():
+    # gunicorn workers each keep their own samples; with PROMETHEUS_MULTIPROC_DIR
+    # set they are written there and merged on scrape
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+def init_metrics(app):
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_duration(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            REQUEST_DURATION.labels(request.method, request.endpoint or 'unmatched', response.status_code).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
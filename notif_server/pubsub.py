@@ -0,0 +1,87 @@
+import logging
+import queue
+import threading
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    def __init__(self, broker, org_id, max_queue):
+        self.broker = broker
+        self.org_id = org_id
+        self.queue = queue.Queue(max_queue)
+        self.overflowed = False
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class NotificationBroker:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, org_id):
+        subscription = Subscription(self, org_id, self.max_queue)
+        with self.lock:
+            self.subscribers.setdefault(org_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.org_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.org_id]
+
+    def publish(self, notification):
+        with self.lock:
+            subscribers = list(self.subscribers.get(notification["organization_id"], ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(notification)
+            except queue.Full:
+                # the client falls behind; it reconnects and replays from Last-Event-ID
+                subscription.overflowed = True
+
+    def connection_count(self):
+        with self.lock:
+            return sum(len(subscribers) for subscribers in self.subscribers.values())
+
+def tail_notifications(collection, broker, stop_event):
+    resume_token = None
+    while not stop_event.is_set():
+        try:
+            with collection.watch([{"$match": {"operationType": "insert"}}], resume_after=resume_token) as stream:
+                while not stop_event.is_set():
+                    change = stream.try_next()
+                    if change is None:
+                        stop_event.wait(0.1)
+                        continue
+                    resume_token = stream.resume_token
+                    broker.publish(change["fullDocument"])
+        except PyMongoError:
+            logger.exception('Notification change stream failed, reconnecting')
+            stop_event.wait(1)
+
+def start_tailer(collection, broker):
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=tail_notifications, args=(collection, broker, stop_event),
+        name='notification-change-stream', daemon=True
+    )
+    thread.start()
+    return stop_event
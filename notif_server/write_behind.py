@@ -0,0 +1,66 @@
+import logging
+import threading
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+class BufferFull(Exception):
+    pass
+
+class WriteBehindBuffer:
+    def __init__(self, flush, max_size, flush_interval, max_pending):
+        self.flush_callback = flush
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = []
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='notification-write-behind', daemon=True)
+        self.thread.start()
+
+    def add(self, document):
+        # a batch being flushed still counts, since a failed flush puts it back
+        with self.lock:
+            if len(self.pending) + self.in_flight >= self.max_pending:
+                raise BufferFull()
+            self.pending.append(document)
+            full = len(self.pending) >= self.max_size
+        if full:
+            self.flush()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+                self.in_flight = len(batch)
+            if not batch:
+                return 0
+            try:
+                failed = self.flush_callback(batch)
+            except PyMongoError:
+                logger.exception('Write-behind flush of %d notifications failed, requeueing', len(batch))
+                with self.lock:
+                    self.pending = batch + self.pending
+                    self.in_flight = 0
+                return 0
+            with self.lock:
+                self.in_flight = 0
+            if failed:
+                logger.error('Write-behind flush dropped %d invalid notifications', len(failed))
+            return len(batch) - len(failed)
+
+    def run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(self.flush_interval)
+        self.flush()